@@ -0,0 +1,267 @@
+import os
+import sys
+import collections
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+sys.path.append(os.path.dirname(__file__))
+import figureTools
+
+__version__ = 0.1
+
+def getSampleRng(seed, index):
+    """seed와 sample 번호로 독립된 난수 생성기를 만듬
+    같은 (seed, index)면 항상 같은 난수열이 나옴
+    args
+        seed : int
+        index : int
+    return
+        rng : np.random.Generator
+    """
+    seedSeq = np.random.SeedSequence(seed, spawn_key=(int(index),))
+    return np.random.Generator(np.random.PCG64(seedSeq))
+
+def getFigureSample(index, seed = 0, imgSize = (300, 300), answer = None, maxOverDraw = 2, thickRange = (0, 20)):
+    """index번째 sample을 만듬, 결과는 (seed, index)에만 의존함
+    args
+        index : int
+        seed : int
+        imgSize : tuple
+        answer : None => 랜덤, int => 도형 (0 : 사각형, 1 : 원)
+        maxOverDraw : int
+        thickRange : tuple
+    return
+        img : np.ndarray (R, G, B)
+        answer : int
+    """
+    rng = getSampleRng(seed, index)
+    if answer is None:
+        answer = int(rng.integers(2))
+    img = figureTools.getFigureImageData(imgSize, int(answer), maxOverDraw, rng, thickRange)
+    return img, answer
+
+def _getAnswerList(answers, start, stop):
+    """[start, stop) 범위의 sample별 정답을 리스트로 반환함
+    """
+    if answers is None or isinstance(answers, (int, np.integer)):
+        return [answers] * (stop - start)
+    return [int(it) for it in answers[start:stop]]
+
+def _generateFigureChunk(args):
+    """process pool의 worker에서 실행되는 함수, [start, stop) 범위를 만듬
+    """
+    start, stop, seed, imgSize, answerList, maxOverDraw, thickRange = args
+    imgs = np.empty((stop - start,) + tuple(imgSize) + (3,), np.uint8)
+    labels = np.empty(stop - start, np.int64)
+    for itNum, itIndex in enumerate(range(start, stop)):
+        imgs[itNum], labels[itNum] = getFigureSample(itIndex, seed, imgSize, answerList[itNum], maxOverDraw, thickRange)
+    return imgs, labels
+
+def generateFigureDataset(n, imgSize = (300, 300), answers = None, maxOverDraw = 2, seed = 0, workers = 1, chunkSize = 64, out = None, start = 0, thickRange = (0, 20)):
+    """getFigureImageData를 여러 process로 나누어 n개의 sample을 만듬
+    sample마다 (seed, index)로 난수열이 정해지므로 workers, chunkSize와 상관없이 결과가 같음
+    args
+        n : int
+        imgSize : tuple
+        answers : None => 랜덤, int => 모두 같은 도형, sequence => sample별 도형
+        maxOverDraw : int
+        seed : int
+        workers : process 개수, 1이면 현재 process에서 만듬
+        chunkSize : 한 작업에 들어가는 sample 수
+        out : np.ndarray uint8 (n,) + imgSize + (3,) or None
+        start : 첫 sample 번호, [start, start + n) 범위를 만듬
+        thickRange : 첫 도형의 두께 범위
+    return
+        out : np.ndarray uint8 (n,) + imgSize + (3,)
+        labels : np.ndarray int (n,)
+    """
+    assert n > 0 and workers > 0 and chunkSize > 0 and start >= 0
+    if answers is not None and not isinstance(answers, (int, np.integer)):
+        assert n == len(answers)
+    if out is None:
+        out = np.empty((n,) + tuple(imgSize) + (3,), np.uint8)
+    assert out.shape == (n,) + tuple(imgSize) + (3,) and np.uint8 == out.dtype
+    labels = np.empty(n, np.int64)
+    taskList = [(start + itStart, start + min(itStart + chunkSize, n), seed, tuple(imgSize),
+                 _getAnswerList(answers, itStart, min(itStart + chunkSize, n)), maxOverDraw, tuple(thickRange))
+                for itStart in range(0, n, chunkSize)]
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        resultIter = map(_generateFigureChunk, taskList) if executor is None else executor.map(_generateFigureChunk, taskList)
+        for itTask, (itImgs, itLabels) in zip(taskList, resultIter):
+            out[itTask[0] - start:itTask[1] - start] = itImgs
+            labels[itTask[0] - start:itTask[1] - start] = itLabels
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return out, labels
+
+class FigureDatasetView:
+    """sample i가 (seed, i)만의 함수인 가상의 dataset
+    앞의 sample을 만들거나 저장하지 않고 아무 sample이나 O(1)에 다시 만들 수 있음
+    epoch별 섞기와 data parallel rank별 나누기는 sample 번호의 순서만 바꿈
+    """
+    # 섞기용 난수열이 sample 난수열과 겹치지 않도록 spawn_key 앞에 붙이는 값
+    SHUFFLE_STREAM_KEY = 0xFFFFFFFF
+
+    def __init__(self, length, imgSize = (300, 300), answers = None, maxOverDraw = 2, seed = 0,
+                 thickRange = (0, 20), shuffle = False, rank = 0, worldSize = 1):
+        """
+        args
+            length : 전체 sample 개수
+            imgSize, answers, maxOverDraw, seed, thickRange : generateFigureDataset과 같음
+                answers는 None 혹은 int만 가능
+            shuffle : True이면 epoch마다 순서를 섞음
+            rank, worldSize : 전체 순서를 worldSize개로 나눈 것 중 rank 번째만 보여줌
+        """
+        assert length > 0 and 0 <= rank < worldSize
+        assert answers is None or isinstance(answers, (int, np.integer))
+        self.length = length
+        self.imgSize = tuple(imgSize)
+        self.answers = answers
+        self.maxOverDraw = maxOverDraw
+        self.seed = seed
+        self.thickRange = tuple(thickRange)
+        self.shuffle = shuffle
+        self.rank = rank
+        self.worldSize = worldSize
+        self.setEpoch(0)
+
+    def setEpoch(self, epoch):
+        """epoch를 바꾸면 shuffle인 경우 순서가 다시 섞임, 모든 rank가 같은 순서를 씀
+        """
+        self.epoch = epoch
+        if self.shuffle:
+            seedSeq = np.random.SeedSequence(self.seed, spawn_key=(self.SHUFFLE_STREAM_KEY, int(epoch)))
+            order = np.random.Generator(np.random.PCG64(seedSeq)).permutation(self.length)
+        else:
+            order = np.arange(self.length)
+        self.sampleIndices = order[self.rank::self.worldSize]
+
+    def __len__(self):
+        return self.sampleIndices.shape[0]
+
+    def getSampleIndex(self, index):
+        """view의 index를 전체 dataset의 sample 번호로 바꿈
+        """
+        return int(self.sampleIndices[index])
+
+    def __getitem__(self, index):
+        """
+        return
+            img : np.ndarray (R, G, B)
+            answer : int
+        """
+        return getFigureSample(self.getSampleIndex(index), self.seed, self.imgSize, self.answers, self.maxOverDraw, self.thickRange)
+
+    def getBatch(self, indices, out = None):
+        """여러 index를 한번에 만듬
+        args
+            indices : sequence of int (view의 index)
+            out : np.ndarray uint8 (len(indices),) + imgSize + (3,) or None
+        return
+            imgs : np.ndarray uint8
+            labels : np.ndarray int64
+        """
+        if out is None:
+            out = np.empty((len(indices),) + self.imgSize + (3,), np.uint8)
+        labels = np.empty(len(indices), np.int64)
+        for itNum, itIndex in enumerate(indices):
+            out[itNum], labels[itNum] = self[itIndex]
+        return out, labels
+
+class FigureDataStream:
+    """학습 loop용으로 batch를 끝없이 만들어 주는 데이터 소스
+    background worker가 queueDepth 개의 batch를 미리 만들어 두므로
+    소비하는 쪽은 도형 그리기를 기다리지 않고 메모리는 queueDepth 개의 batch로 제한됨
+    batch 번호마다 sample 번호가 정해지므로 결과는 workers와 상관없이 같음
+    """
+    def __init__(self, batchSize = 32, imgSize = (300, 300), answers = None, maxOverDraw = 2, seed = 0,
+                 workers = 2, queueDepth = 4, useProcess = True, stepsPerEpoch = None, thickRange = (0, 20)):
+        """
+        args
+            batchSize : int
+            imgSize : tuple
+            answers : None => 랜덤, int => 모두 같은 도형
+            maxOverDraw : int
+            seed : int
+            workers : background worker 개수
+            queueDepth : 미리 만들어 두는 batch 개수
+            useProcess : True => process pool, False => thread pool
+            stepsPerEpoch : __len__ 값, None이면 길이가 없음
+            thickRange : 첫 도형의 두께 범위
+        """
+        assert batchSize > 0 and workers > 0 and queueDepth > 0
+        assert answers is None or isinstance(answers, (int, np.integer))
+        self.batchSize = batchSize
+        self.imgSize = tuple(imgSize)
+        self.answers = answers
+        self.maxOverDraw = maxOverDraw
+        self.seed = seed
+        self.workers = workers
+        self.queueDepth = queueDepth
+        self.useProcess = useProcess
+        self.stepsPerEpoch = stepsPerEpoch
+        self.thickRange = tuple(thickRange)
+        self._executor = None
+        self._pending = collections.deque()
+        self._nextBatch = 0
+
+    def _getBatchTask(self, batchIndex):
+        start = batchIndex * self.batchSize
+        stop = start + self.batchSize
+        return (start, stop, self.seed, self.imgSize, _getAnswerList(self.answers, start, stop), self.maxOverDraw, self.thickRange)
+
+    def _fillQueue(self):
+        """queue가 queueDepth가 될 때까지 다음 batch 작업을 넣음
+        """
+        if self._executor is None:
+            poolClass = ProcessPoolExecutor if self.useProcess else ThreadPoolExecutor
+            self._executor = poolClass(max_workers=self.workers)
+        while len(self._pending) < self.queueDepth:
+            self._pending.append(self._executor.submit(_generateFigureChunk, self._getBatchTask(self._nextBatch)))
+            self._nextBatch += 1
+
+    def __getitem__(self, batchIndex):
+        """batchIndex 번째 batch를 바로 만듬 (keras Sequence 방식)
+        return
+            imgs : np.ndarray uint8 (batchSize,) + imgSize + (3,)
+            labels : np.ndarray int (batchSize,)
+        """
+        return _generateFigureChunk(self._getBatchTask(batchIndex))
+
+    def __len__(self):
+        if self.stepsPerEpoch is None:
+            raise TypeError("FigureDataStream has no length, set stepsPerEpoch")
+        return self.stepsPerEpoch
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._fillQueue()
+        batch = self._pending.popleft().result()
+        self._fillQueue()
+        return batch
+
+    def close(self):
+        """background worker를 정리함
+        """
+        if self._executor is not None:
+            for itFuture in self._pending:
+                itFuture.cancel()
+            self._executor.shutdown()
+            self._executor = None
+        self._pending.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    imgs, labels = generateFigureDataset(16, seed=0, workers=4)
+    plt.imshow(np.concatenate(list(imgs[:4]), axis=1))
+    plt.title(str(labels[:4]))
+    plt.show()
@@ -0,0 +1,373 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+sys.path.append(os.path.dirname(__file__))
+import figureTools
+import figureDataset
+
+__version__ = 0.1
+
+# 저장 형식
+# dirPath/index.json : 이미지 모양, shard 목록, 생성 정보
+# dirPath/images_00000.npy : (count, rows, cols, 3) uint8, np.memmap으로 열 수 있는 고정 크기 배열
+# dirPath/labels_00000.npy : (count,) int64
+INDEX_FILE_NAME = "index.json"
+
+def _getShardFileNames(shardIndex):
+    return "images_{:05d}.npy".format(shardIndex), "labels_{:05d}.npy".format(shardIndex)
+
+class FigureShardWriter:
+    """생성한 이미지 batch를 고정 크기 shard 파일로 나누어 저장함
+    shard는 np.lib.format.open_memmap으로 만들어 batch를 바로 파일에 씀
+    """
+    def __init__(self, dirPath, imgShape = (300, 300, 3), shardSize = 4096, metaData = None):
+        """
+        args
+            dirPath : 저장할 폴더
+            imgShape : tuple (rows, cols, channels)
+            shardSize : shard 하나에 들어가는 이미지 수
+            metaData : dict, index.json에 같이 저장할 생성 정보
+        """
+        assert shardSize > 0
+        os.makedirs(dirPath, exist_ok=True)
+        self.dirPath = dirPath
+        self.imgShape = tuple(imgShape)
+        self.shardSize = shardSize
+        self.metaData = {} if metaData is None else dict(metaData)
+        self.shardList = []
+        self.count = 0
+        self._imgShard = None
+        self._labelShard = None
+        self._shardCount = 0
+
+    def _openShard(self):
+        imgFileName, labelFileName = _getShardFileNames(len(self.shardList))
+        self._imgShard = np.lib.format.open_memmap(os.path.join(self.dirPath, imgFileName), mode="w+",
+                                                   dtype=np.uint8, shape=(self.shardSize,) + self.imgShape)
+        self._labelShard = np.lib.format.open_memmap(os.path.join(self.dirPath, labelFileName), mode="w+",
+                                                     dtype=np.int64, shape=(self.shardSize,))
+        self._shardCount = 0
+
+    def _closeShard(self):
+        """채워진 만큼만 남기고 shard를 닫음
+        """
+        imgFileName, labelFileName = _getShardFileNames(len(self.shardList))
+        count = self._shardCount
+        self._imgShard.flush()
+        self._labelShard.flush()
+        # 마지막 shard가 덜 찬 경우 크기에 맞게 다시 씀
+        shardPairList = ((imgFileName, self._imgShard), (labelFileName, self._labelShard))
+        if count < self.shardSize:
+            for itFileName, itShard in shardPairList:
+                np.save(os.path.join(self.dirPath, "tmp_" + itFileName), itShard[:count])
+        # memmap을 닫은 뒤 파일을 바꿈
+        self._imgShard = None
+        self._labelShard = None
+        itShard = shardPairList = None
+        if count < self.shardSize:
+            for itFileName in (imgFileName, labelFileName):
+                os.replace(os.path.join(self.dirPath, "tmp_" + itFileName), os.path.join(self.dirPath, itFileName))
+        self.shardList.append({"images": imgFileName, "labels": labelFileName, "count": count})
+
+    def write(self, imgs, labels):
+        """batch를 이어서 씀
+        args
+            imgs : np.ndarray uint8 (n,) + imgShape
+            labels : np.ndarray int (n,)
+        """
+        assert imgs.shape[1:] == self.imgShape and imgs.shape[0] == len(labels)
+        written = 0
+        while written < imgs.shape[0]:
+            if self._imgShard is None:
+                self._openShard()
+            count = min(self.shardSize - self._shardCount, imgs.shape[0] - written)
+            self._imgShard[self._shardCount:self._shardCount + count] = imgs[written:written + count]
+            self._labelShard[self._shardCount:self._shardCount + count] = labels[written:written + count]
+            self._shardCount += count
+            written += count
+            if self._shardCount == self.shardSize:
+                self._closeShard()
+        self.count += written
+
+    def close(self):
+        """남은 shard를 닫고 index.json을 씀
+        """
+        if self._imgShard is not None:
+            self._closeShard()
+        indexData = {
+            "version": __version__,
+            "imgShape": list(self.imgShape),
+            "dtype": "uint8",
+            "shardSize": self.shardSize,
+            "count": self.count,
+            "shards": self.shardList,
+            "meta": self.metaData,
+        }
+        with open(os.path.join(self.dirPath, INDEX_FILE_NAME), "w", encoding="utf-8") as indexFile:
+            json.dump(indexData, indexFile, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+class FigureShardReader:
+    """FigureShardWriter로 저장한 shard를 np.memmap으로 열어 복사 없이 임의 접근함
+    """
+    def __init__(self, dirPath, count = None):
+        """
+        args
+            dirPath : index.json이 있는 폴더
+            count : 앞에서부터 count개만 사용함, None이면 전부
+        """
+        with open(os.path.join(dirPath, INDEX_FILE_NAME), encoding="utf-8") as indexFile:
+            self.indexData = json.load(indexFile)
+        self.dirPath = dirPath
+        self.imgShape = tuple(self.indexData["imgShape"])
+        self.metaData = self.indexData.get("meta", {})
+        shardList = self.indexData["shards"]
+        self.imgShards = [np.load(os.path.join(dirPath, it["images"]), mmap_mode="r") for it in shardList]
+        # label은 작으므로 메모리에 올림
+        labelList = [np.load(os.path.join(dirPath, it["labels"])) for it in shardList]
+        self.labels = np.concatenate(labelList) if 0 < len(labelList) else np.empty(0, np.int64)
+        self.shardOffsets = np.cumsum([0] + [it["count"] for it in shardList])
+        if count is not None:
+            assert 0 <= count <= self.shardOffsets[-1]
+            self.shardOffsets = np.minimum(self.shardOffsets, count)
+            self.labels = self.labels[:count]
+
+    def __len__(self):
+        return int(self.shardOffsets[-1])
+
+    def __getitem__(self, index):
+        """index 번째 (img, label), img는 memmap view
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("index {} is out of range".format(index))
+        shardIndex = int(np.searchsorted(self.shardOffsets, index, side="right")) - 1
+        return self.imgShards[shardIndex][index - self.shardOffsets[shardIndex]], int(self.labels[index])
+
+    def getBatch(self, indices, out = None):
+        """여러 index를 한번에 읽음, shard별로 묶어서 읽음
+        args
+            indices : sequence of int
+            out : np.ndarray uint8 (len(indices),) + imgShape or None
+        return
+            imgs : np.ndarray uint8
+            labels : np.ndarray int64
+        """
+        indices = np.asarray(indices, np.int64)
+        if out is None:
+            out = np.empty((indices.shape[0],) + self.imgShape, np.uint8)
+        shardIndices = np.searchsorted(self.shardOffsets, indices, side="right") - 1
+        for itShard in np.unique(shardIndices):
+            selected = np.flatnonzero(shardIndices == itShard)
+            out[selected] = self.imgShards[itShard][indices[selected] - self.shardOffsets[itShard]]
+        return out, self.labels[indices]
+
+def writeFigureShards(dirPath, imgs, labels, shardSize = 4096, metaData = None):
+    """메모리에 있는 이미지들을 shard로 저장함
+    args
+        dirPath : 저장할 폴더
+        imgs : np.ndarray uint8 (n, rows, cols, 3)
+        labels : np.ndarray int (n,)
+        shardSize : int
+        metaData : dict or None
+    """
+    with FigureShardWriter(dirPath, imgs.shape[1:], shardSize, metaData) as writer:
+        writer.write(imgs, labels)
+
+def exportFigureDataset(dirPath, n, imgSize = (300, 300), answers = None, maxOverDraw = 2, seed = 0, workers = 1, shardSize = 4096,
+                        thickRange = (0, 20)):
+    """figureDataset.generateFigureDataset으로 shard 단위로 만들면서 바로 저장함
+    메모리는 shard 하나 크기만 사용함
+    args
+        dirPath : 저장할 폴더
+        n : int
+        imgSize, answers, maxOverDraw, seed, workers, thickRange : generateFigureDataset과 같음
+        shardSize : int
+    return
+        reader : FigureShardReader
+    """
+    # 같은 설정으로 다시 만들 수 있도록 생성 인자를 모두 기록함
+    if answers is None or isinstance(answers, (int, np.integer)):
+        answersMeta = None if answers is None else int(answers)
+    else:
+        answersMeta = [int(it) for it in answers]
+    metaData = {
+        "imgSize": [int(it) for it in imgSize],
+        "answers": answersMeta,
+        "maxOverDraw": int(maxOverDraw),
+        "seed": int(seed),
+        "thickRange": [int(it) for it in thickRange],
+        "figureToolsVersion": figureTools.__version__,
+        "figureDatasetVersion": figureDataset.__version__,
+    }
+    with FigureShardWriter(dirPath, tuple(imgSize) + (3,), shardSize, metaData) as writer:
+        for itStart in range(0, n, shardSize):
+            count = min(shardSize, n - itStart)
+            shardAnswers = answers if answers is None or isinstance(answers, (int, np.integer)) else answers[itStart:itStart + count]
+            imgs, labels = figureDataset.generateFigureDataset(count, imgSize, shardAnswers, maxOverDraw, seed, workers, start=itStart,
+                                                               thickRange=thickRange)
+            writer.write(imgs, labels)
+    return FigureShardReader(dirPath)
+
+class FigureDatasetCache:
+    """생성 인자로 key를 만들어 이미 만든 shard를 다시 사용하는 cache
+    shard k는 항상 sample [k * shardSize, (k + 1) * shardSize)이므로 없는 shard만 만들면 됨
+    maxBytes를 넘으면 가장 오래 사용하지 않은 항목부터 지움 (LRU)
+    """
+    META_FILE_NAME = "cache.json"
+
+    def __init__(self, cacheDir, maxBytes = None, shardSize = 4096, workers = 1):
+        """
+        args
+            cacheDir : cache 폴더
+            maxBytes : 디스크 사용량 상한, None이면 지우지 않음
+            shardSize : shard 하나에 들어가는 이미지 수
+            workers : 생성 process 개수
+        """
+        assert shardSize > 0
+        os.makedirs(cacheDir, exist_ok=True)
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.shardSize = shardSize
+        self.workers = workers
+
+    def getKey(self, imgSize = (300, 300), answers = None, maxOverDraw = 2, seed = 0, thickRange = (0, 20)):
+        """생성 인자와 생성기 버전으로 cache key를 만듬
+        """
+        params = self._getParams(imgSize, answers, maxOverDraw, seed, thickRange)
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _getParams(self, imgSize, answers, maxOverDraw, seed, thickRange):
+        assert answers is None or isinstance(answers, (int, np.integer))
+        return {
+            "imgSize": [int(it) for it in imgSize],
+            "answers": None if answers is None else int(answers),
+            "maxOverDraw": int(maxOverDraw),
+            "seed": int(seed),
+            "thickRange": [int(it) for it in thickRange],
+            "shardSize": self.shardSize,
+            "figureToolsVersion": figureTools.__version__,
+            "figureDatasetVersion": figureDataset.__version__,
+        }
+
+    def getDataset(self, n, imgSize = (300, 300), answers = None, maxOverDraw = 2, seed = 0, thickRange = (0, 20)):
+        """n개 sample의 dataset을 반환함, 없는 shard만 새로 만듬
+        args
+            n : int
+            imgSize, answers, maxOverDraw, seed, thickRange : figureDataset.generateFigureDataset과 같음
+                answers는 None 혹은 int만 가능
+        return
+            reader : FigureShardReader (앞의 n개)
+        """
+        assert n > 0
+        params = self._getParams(imgSize, answers, maxOverDraw, seed, thickRange)
+        key = self.getKey(imgSize, answers, maxOverDraw, seed, thickRange)
+        entryDir = os.path.join(self.cacheDir, key)
+        os.makedirs(entryDir, exist_ok=True)
+        metaData = self._loadMeta(entryDir, params)
+        shardCounts = metaData["shards"]
+        for itShard in range((n + self.shardSize - 1) // self.shardSize):
+            count = min(self.shardSize, n - itShard * self.shardSize)
+            # 이미 있는 shard가 충분히 크면 다시 사용함
+            if shardCounts.get(str(itShard), 0) >= count:
+                continue
+            self._generateShard(entryDir, itShard, count, params)
+            shardCounts[str(itShard)] = count
+            metaData["lastUsed"] = time.time()
+            self._saveMeta(entryDir, metaData)
+        metaData["lastUsed"] = time.time()
+        self._saveMeta(entryDir, metaData)
+        self._writeIndex(entryDir, metaData)
+        self.evict(keepKey=key)
+        return FigureShardReader(entryDir, count=n)
+
+    def _loadMeta(self, entryDir, params):
+        metaPath = os.path.join(entryDir, self.META_FILE_NAME)
+        if os.path.isfile(metaPath):
+            with open(metaPath, encoding="utf-8") as metaFile:
+                return json.load(metaFile)
+        return {"params": params, "shards": {}, "lastUsed": time.time()}
+
+    def _saveMeta(self, entryDir, metaData):
+        tmpPath = os.path.join(entryDir, "tmp_" + self.META_FILE_NAME)
+        with open(tmpPath, "w", encoding="utf-8") as metaFile:
+            json.dump(metaData, metaFile, indent=2)
+        os.replace(tmpPath, os.path.join(entryDir, self.META_FILE_NAME))
+
+    def _generateShard(self, entryDir, shardIndex, count, params):
+        """shard 하나를 만들어 임시 파일에 쓴 뒤 바꿈
+        """
+        imgFileName, labelFileName = _getShardFileNames(shardIndex)
+        imgSize = tuple(params["imgSize"])
+        imgs = np.lib.format.open_memmap(os.path.join(entryDir, "tmp_" + imgFileName), mode="w+",
+                                         dtype=np.uint8, shape=(count,) + imgSize + (3,))
+        _, labels = figureDataset.generateFigureDataset(count, imgSize, params["answers"], params["maxOverDraw"], params["seed"],
+                                                        self.workers, out=imgs, start=shardIndex * self.shardSize,
+                                                        thickRange=tuple(params["thickRange"]))
+        imgs.flush()
+        imgs = None
+        np.save(os.path.join(entryDir, "tmp_" + labelFileName), labels)
+        for itFileName in (imgFileName, labelFileName):
+            os.replace(os.path.join(entryDir, "tmp_" + itFileName), os.path.join(entryDir, itFileName))
+
+    def _writeIndex(self, entryDir, metaData):
+        """앞에서부터 이어진 shard로 FigureShardReader용 index.json을 씀
+        """
+        shardCounts = metaData["shards"]
+        shardList = []
+        while str(len(shardList)) in shardCounts:
+            imgFileName, labelFileName = _getShardFileNames(len(shardList))
+            shardList.append({"images": imgFileName, "labels": labelFileName, "count": shardCounts[str(len(shardList))]})
+        indexData = {
+            "version": __version__,
+            "imgShape": metaData["params"]["imgSize"] + [3],
+            "dtype": "uint8",
+            "shardSize": self.shardSize,
+            "count": sum(it["count"] for it in shardList),
+            "shards": shardList,
+            "meta": metaData["params"],
+        }
+        with open(os.path.join(entryDir, INDEX_FILE_NAME), "w", encoding="utf-8") as indexFile:
+            json.dump(indexData, indexFile, indent=2)
+
+    def _getEntryList(self):
+        """(lastUsed, size, key) 목록
+        """
+        entryList = []
+        for itKey in os.listdir(self.cacheDir):
+            entryDir = os.path.join(self.cacheDir, itKey)
+            metaPath = os.path.join(entryDir, self.META_FILE_NAME)
+            if not os.path.isfile(metaPath):
+                continue
+            with open(metaPath, encoding="utf-8") as metaFile:
+                lastUsed = json.load(metaFile).get("lastUsed", 0)
+            size = sum(os.path.getsize(os.path.join(entryDir, it)) for it in os.listdir(entryDir))
+            entryList.append((lastUsed, size, itKey))
+        return entryList
+
+    def evict(self, keepKey = None):
+        """maxBytes 이하가 될 때까지 오래된 항목부터 지움
+        args
+            keepKey : 지우지 않을 key
+        """
+        if self.maxBytes is None:
+            return
+        entryList = sorted(self._getEntryList())
+        totalBytes = sum(it[1] for it in entryList)
+        for itLastUsed, itSize, itKey in entryList:
+            if totalBytes <= self.maxBytes:
+                break
+            if itKey == keepKey:
+                continue
+            shutil.rmtree(os.path.join(self.cacheDir, itKey), ignore_errors=True)
+            totalBytes -= itSize
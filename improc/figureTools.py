@@ -5,300 +5,668 @@ import matplotlib.pyplot as plt
 
 __version__ = 0.2
 
-def createRandomCircle(imgSize = (300, 300), shapeColor = (255, 255, 255), thickness = 1):
+def _randrange(rng, start, stop, step = 1):
+    """rng가 None이면 전역 random 모듈을, 아니면 np.random.Generator를 사용하는 randrange
+    args
+        rng : np.random.Generator or None
+    return
+        int [start, stop)
+    """
+    if rng is None:
+        return rd.randrange(start, stop, step)
+    count = (stop - start + step - 1) // step
+    if count <= 0:
+        raise ValueError("empty range for randrange({}, {}, {})".format(start, stop, step))
+    return start + step * int(rng.integers(count))
+
+# 도형 정보
+# 도형은 dict로 표현하며 좌표는 (x, y), 이미지 모양은 imgSize + (3,) 혹은 imgSize
+#   circle : {"type": "circle", "center": (x, y), "radius": int, "thickness": int}
+#   rect, triangle : {"type": ..., "points": np.ndarray (k, 2), "thickness": int, "holePoints": np.ndarray or None}
+# thickness가 음수이면 채운 도형, holePoints가 있으면 바깥과 속 사이만 채움
+def _getRotatedRectPoints(centerPt, halfWidth, halfHeight, rotDeg):
+    """중심점 기준으로 회전된 사각형의 꼭지점을 계산함
+    cv2.getRotationMatrix2D(centerPt, rotDeg, 1)로 회전시킨 것과 같은 방향
+    args
+        centerPt : tuple (center x, center y)
+        halfWidth, halfHeight : float
+        rotDeg : number
+    return
+        points : np.ndarray float (4, 2)
+    """
+    rotRadians = np.deg2rad(rotDeg)
+    cosVal, sinVal = np.cos(rotRadians), np.sin(rotRadians)
+    localPts = np.array([[-halfWidth, -halfHeight], [halfWidth, -halfHeight],
+                         [halfWidth, halfHeight], [-halfWidth, halfHeight]])
+    rotMatrix = np.array([[cosVal, sinVal], [-sinVal, cosVal]])
+    return localPts @ rotMatrix.T + np.asarray(centerPt, np.float64)
+
+def _toPolyPoints(points, shift = 4):
+    """소수점 꼭지점을 cv2 polygon 함수의 shift 형식 좌표로 바꿈
+    """
+    return np.round(points * (1 << shift)).astype(np.int32)
+
+def _getRandomCircleShape(imgSize, thickness, rng = None):
+    """createRandomCircle용 원 정보
+    """
+    centerPt, radius = _getRandomCircleInfo(imgSize, thickness, rng=rng)
+    return {"type": "circle", "center": centerPt, "radius": radius, "thickness": thickness}
+
+def _getRandomRotatedRectShape(imgSize, thickness, rng = None):
+    """createRandomRotatedRect용 사각형 정보, 회전된 꼭지점을 직접 계산함
+    """
+    # 바깥 원 정보 받음
+    centerPt, radius = _getRandomCircleInfo(imgSize, thickness, rng=rng)
+    # 회전 시킬 각도
+    rotDeg = _randrange(rng, 0, 90, 15)
+    # 각도로 사각형의 가로 세로 길이를 결정
+    rectRadians = np.deg2rad(_randrange(rng, 10, 90, 10))
+    rectPts = _getRotatedRectPoints(centerPt, radius * np.cos(rectRadians), radius * np.sin(rectRadians), rotDeg)
+    return {"type": "rect", "points": rectPts, "thickness": thickness, "holePoints": None}
+
+def _getSharpRectMinRadius(thickness, rectDeg):
+    """속 사각형이 남기 위한 최소 반지름
+    """
+    rectRadians = np.deg2rad(rectDeg)
+    return int(math.ceil(thickness / min(np.cos(rectRadians), np.sin(rectRadians)))) + 1
+
+def _getRandomRotatedSharpRectShape(imgSize, thickness, rng = None):
+    """createRandomRotatedSharpRect용 사각형 정보
+    속 사각형이 남는 각도와 반지름만 뽑으므로 재시도가 없음
+    """
+    if 0 > thickness:
+        return _getRandomRotatedRectShape(imgSize, thickness, rng)
+    # 속 사각형이 남을 수 있는 각도만 고름
+    maxRadius = _getMaxCircleRadius(imgSize, thickness)
+    rectDegList = [itDeg for itDeg in range(10, 90, 10) if _getSharpRectMinRadius(thickness, itDeg) < maxRadius]
+    # 이미지가 너무 작아 속 사각형이 남을 수 없으면 채운 사각형
+    if 0 == len(rectDegList):
+        return _getRandomRotatedRectShape(imgSize, -1, rng)
+    rectDeg = rectDegList[_randrange(rng, 0, len(rectDegList))]
+    # 바깥 원 정보 받음
+    centerPt, radius = _getRandomCircleInfo(imgSize, thickness, _getSharpRectMinRadius(thickness, rectDeg), rng)
+    rectRadians = np.deg2rad(rectDeg)
+    halfWidth, halfHeight = radius * np.cos(rectRadians), radius * np.sin(rectRadians)
+    # 회전할 각도
+    rotDeg = _randrange(rng, 0, 90, 15)
+    outPts = _getRotatedRectPoints(centerPt, halfWidth, halfHeight, rotDeg)
+    inPts = _getRotatedRectPoints(centerPt, halfWidth - thickness, halfHeight - thickness, rotDeg)
+    return {"type": "rect", "points": outPts, "thickness": -1, "holePoints": inPts}
+
+def _getRandomTriangleShape(imgSize, thickness, rng = None):
+    """createRandomTriangle용 삼각형 정보
+    """
+    padding = (thickness // 2 + 1) if thickness > 0 else 1
+    minPos = padding
+    maxPosX = imgSize[1] - padding
+    maxPosY = imgSize[0] - padding
+    ptList = []
+    for itPt in range(3):
+        ptList.append([_randrange(rng, minPos, maxPosX), _randrange(rng, minPos, maxPosY)])
+    return {"type": "triangle", "points": np.array(ptList, np.float64), "thickness": thickness, "holePoints": None}
+
+def drawShape(img, shape, color = 255):
+    """도형 정보를 img에 바로 그림, 1채널 마스크와 3채널 이미지 모두 가능
+    args
+        img : np.ndarray (rows, cols) or (rows, cols, 3)
+        shape : 도형 정보 dict
+        color : 1채널이면 int, 3채널이면 tuple
+    return
+        img : np.ndarray
+    """
+    thickness = shape["thickness"]
+    if "circle" == shape["type"]:
+        cv2.circle(img, shape["center"], shape["radius"], color, thickness)
+        return img
+    polyList = [_toPolyPoints(shape["points"])]
+    if shape.get("holePoints") is not None:
+        polyList.append(_toPolyPoints(shape["holePoints"]))
+    # 바깥과 속 polygon을 한번에 채우면 속은 비게 됨
+    if 0 > thickness or 1 < len(polyList):
+        cv2.fillPoly(img, polyList, color, shift=4)
+    else:
+        cv2.polylines(img, polyList, True, color, thickness, shift=4)
+    return img
+
+def _getShapeRoughBox(shape, imgShape):
+    """도형 정보로 계산한 도형을 포함하는 영역 (x0, y0, x1, y1), 이미지 범위로 자름
+    """
+    halfThick = max(shape["thickness"], 0) // 2 + 2
+    if "circle" == shape["type"]:
+        centerX, centerY = shape["center"]
+        extent = shape["radius"] + halfThick
+        x0, y0, x1, y1 = centerX - extent, centerY - extent, centerX + extent + 1, centerY + extent + 1
+    else:
+        x0, y0 = np.floor(shape["points"].min(axis=0)).astype(int) - halfThick
+        x1, y1 = np.ceil(shape["points"].max(axis=0)).astype(int) + halfThick + 1
+    rows, cols = imgShape[:2]
+    return max(int(x0), 0), max(int(y0), 0), min(int(x1), cols), min(int(y1), rows)
+
+def getShapeBoundingBox(shapeMask, shape):
+    """도형 마스크의 bounding box, 도형 정보로 구한 영역 안만 확인함
+    args
+        shapeMask : np.ndarray (rows, cols), 이 도형만 그려진 마스크
+        shape : 도형 정보 dict
+    return
+        bbox : tuple (x, y, width, height)
+    """
+    x0, y0, x1, y1 = _getShapeRoughBox(shape, shapeMask.shape)
+    boxX, boxY, boxWidth, boxHeight = cv2.boundingRect(shapeMask[y0:y1, x0:x1])
+    return (x0 + boxX, y0 + boxY, boxWidth, boxHeight)
+
+def _renderShapeMask(imgSize, shape):
+    """도형 하나만 그린 1채널 마스크와 bounding box
+    """
+    shapeMask = np.zeros(tuple(imgSize[:2]), np.uint8)
+    drawShape(shapeMask, shape, 255)
+    return shapeMask, getShapeBoundingBox(shapeMask, shape)
+
+def createRandomCircleMask(imgSize = (300, 300), thickness = 1, rng = None):
+    """createRandomCircle을 1채널 마스크로 바로 그림
+    args
+        imgSize : tuple 마스크 모양
+        thickness : int
+        rng : np.random.Generator or None => 전역 random 모듈
+    return
+        shapeMask : np.ndarray uint8 (rows, cols) {0, 255}
+        bbox : tuple (x, y, width, height)
+    """
+    return _renderShapeMask(imgSize, _getRandomCircleShape(imgSize, thickness, rng))
+
+def createRandomRotatedRectMask(imgSize = (300, 300), thickness = 1, rng = None):
+    """createRandomRotatedRect을 1채널 마스크로 바로 그림
+    return
+        shapeMask : np.ndarray uint8 (rows, cols) {0, 255}
+        bbox : tuple (x, y, width, height)
+    """
+    return _renderShapeMask(imgSize, _getRandomRotatedRectShape(imgSize, thickness, rng))
+
+def createRandomRotatedSharpRectMask(imgSize = (300, 300), thickness = 1, rng = None):
+    """createRandomRotatedSharpRect을 1채널 마스크로 바로 그림
+    return
+        shapeMask : np.ndarray uint8 (rows, cols) {0, 255}
+        bbox : tuple (x, y, width, height)
+    """
+    return _renderShapeMask(imgSize, _getRandomRotatedSharpRectShape(imgSize, thickness, rng))
+
+def createRandomTriangleMask(imgSize = (300, 300), thickness = 1, rng = None):
+    """createRandomTriangle을 1채널 마스크로 바로 그림
+    return
+        shapeMask : np.ndarray uint8 (rows, cols) {0, 255}
+        bbox : tuple (x, y, width, height)
+    """
+    return _renderShapeMask(imgSize, _getRandomTriangleShape(imgSize, thickness, rng))
+
+def createRandomCircle(imgSize = (300, 300), shapeColor = (255, 255, 255), thickness = 1, rng = None):
     """절단 방지, 이미지 경계 겹침 방지, 랜덤으로 원을 생성
     args
         imgSize : tuple (width, height)
         shapeColor : tuple (R, G, B)
         thickness : int
+        rng : np.random.Generator or None => 전역 random 모듈
     return
         circle img : cv2.np.ndarray
     """
-    # 바깥 원 정보 받음
-    centerPt, radius = _getRandomCircleInfo(imgSize, thickness)
-    centerX, centerY = centerPt
-    # 원을 그림
-    imgShape = imgSize + (3,)
-    circleImg = np.zeros(imgShape, np.uint8)
-    cvShapeColor = shapeColor[::-1]
-    cv2.circle(circleImg, centerPt, radius, cvShapeColor, thickness)
-    return cv2.cvtColor(circleImg, cv2.COLOR_BGR2RGB)
-
-def createRandomSharpCircle(imgSize = (300, 300), shapeColor = (255, 255, 255), thickness = 1):
+    circleImg = np.zeros(imgSize + (3,), np.uint8)
+    return drawShape(circleImg, _getRandomCircleShape(imgSize, thickness, rng), shapeColor)
+
+def createRandomSharpCircle(imgSize = (300, 300), shapeColor = (255, 255, 255), thickness = 1, rng = None):
     """sharp rectangle과 마찬가지로 두께에 영향을 줄이기 위한 코드
     근데 만들고 나니 원은 상관없다는 사실을 늦게 깨달았다;
     args
         imgSize : tuple (width, height)
         shapeColor : tuple (R, G, B)
         thickness : int
+        rng : np.random.Generator or None => 전역 random 모듈
     return
         circle img : cv2.np.ndarray
     """
     if 0 > thickness:
-        return createRandomCircle
-    # 바깥 원 정보 받음
-    centerPt, radius = _getRandomCircleInfo(imgSize, -1)
-    # 만약 반지름이 경계 두께보다 얇으면 다시 호출함
-    while radius < thickness:
-        centerPt, radius = _getRandomCircleInfo(imgSize, -1)
-    centerX, centerY = centerPt
+        return createRandomCircle(imgSize, shapeColor, thickness, rng)
+    # 바깥 원 정보 받음, 반지름이 경계 두께보다 얇지 않도록 하한을 줌
+    centerPt, radius = _getRandomCircleInfo(imgSize, -1, inPadding=thickness, rng=rng)
     # 바깥 원을 그림
-    imgShape = imgSize + (3,)
-    circleImg = np.zeros(imgShape, np.uint8)
-    cvShapeColor = shapeColor[::-1]
-    cv2.circle(circleImg, centerPt, radius, cvShapeColor, -1)
+    circleImg = np.zeros(imgSize + (3,), np.uint8)
+    cv2.circle(circleImg, centerPt, radius, shapeColor, -1)
     # 쪽 원을 반전 색으로 그림
-    revCvShapeColor = tuple(255 - cvShapeColor[itNum] for itNum in range(3))
-    cv2.circle(circleImg, centerPt, radius - thickness, revCvShapeColor, -1)
-    return cv2.cvtColor(circleImg, cv2.COLOR_BGR2RGB)
-    
+    revShapeColor = tuple(255 - shapeColor[itNum] for itNum in range(3))
+    cv2.circle(circleImg, centerPt, radius - thickness, revShapeColor, -1)
+    return circleImg
 
-def createRandomRotatedRect(imgSize = (300, 300), rectColor = (255, 255, 255), thickness = 1):
+def createRandomRotatedRect(imgSize = (300, 300), rectColor = (255, 255, 255), thickness = 1, rng = None):
     """짤림 방지된 회전된 사각형 생성 원을 기반으로 그림
+    회전된 꼭지점을 직접 계산해서 polygon으로 그림
     args
         imgSize : tuple (width, height)
         rectColor : tuple (R, G, B)
         thickness : int
+        rng : np.random.Generator or None => 전역 random 모듈
     return
         rotated rectange img : cv2.np.ndarray
     """
-    # 바깥 원 정보 받음
-    centerPt, radius = _getRandomCircleInfo(imgSize, thickness)
-    centerX, centerY = centerPt
-    # 회전 시킬 각도
-    rotDeg = rd.randrange(0, 90, 15)
-    # 각도로 사각형의 start, end point를 결정
-    rectDeg = rd.randrange(10, 90, 10)
-    endX = int(round(centerX + radius * math.cos(rectDeg)))
-    endY = int(round(centerY + radius * math.sin(rectDeg)))
-    endPt = (endX, endY)
-    startX = int(round(centerX - radius * math.cos(rectDeg)))
-    startY = int(round(centerY - radius * math.sin(rectDeg)))
-    startPt = (startX, startY)
-    # 사각형 그리기
-    imgShape = imgSize + (3,)
-    rectImg = np.zeros(imgShape, np.uint8)
-    cvRectColor = rectColor[::-1]
-    cv2.rectangle(rectImg, startPt, endPt, cvRectColor, thickness)
-    # 사각형 회전
-    rotMatrix = cv2.getRotationMatrix2D(centerPt, rotDeg, 1)
-    rotRectImg = cv2.warpAffine(rectImg, rotMatrix, imgSize)
-    return cv2.cvtColor(rotRectImg, cv2.COLOR_BGR2RGB)
-
-def createRandomRotatedSharpRect(imgSize = (300, 300), rectColor = (255, 255, 255), thickness = 1):
+    rectImg = np.zeros(imgSize + (3,), np.uint8)
+    return drawShape(rectImg, _getRandomRotatedRectShape(imgSize, thickness, rng), rectColor)
+
+def createRandomRotatedSharpRect(imgSize = (300, 300), rectColor = (255, 255, 255), thickness = 1, rng = None):
     """createRandomRotatedRect의 경우 경계가 굵어 질 수 록 꼭지점 부분이 라운드가 발생하는 것을 방지하는 사각형
+    바깥 사각형과 속 사각형을 하나의 polygon으로 한번에 채움
     args
         imgSize : tuple (width, height)
         rectColor : drawing color (R, G, B)
         thickness : int
+        rng : np.random.Generator or None => 전역 random 모듈
     return
         rotated Sharp Rectangle image : cv2.np.ndarray
     """
-    if -1 == thickness:
-        return createRandomRotatedRect(imgSize, rectColor, thickness)
-    # 바깥 원 정보 받음
-    centerPt, radius = _getRandomCircleInfo(imgSize, thickness)
-    centerX, centerY = centerPt
-    # 사각형 그리기
-    rectDeg = rd.randrange(10, 90, 10)
-    endX = int(round(centerX + radius * np.cos(np.deg2rad(rectDeg))))
-    endY = int(round(centerY + radius * np.sin(np.deg2rad(rectDeg))))
-    startX = int(round(centerX - radius * np.cos(np.deg2rad(rectDeg))))
-    startY = int(round(centerY - radius * np.sin(np.deg2rad(rectDeg))))
-    endPt = (endX, endY)
-    startPt = (startX, startY)
-    imgShape = imgSize + (3,)
-    rectImg = np.zeros(imgShape, np.uint8)
-    cvRectColor = rectColor[::-1]
-    # 속 사각형 그리기
-    startInPt = (startX + thickness, startY + thickness)
-    endInPt = (endX - thickness, endY - thickness)
-    # 속 사각형을 바깥 사각형보다 커지는 경우 재귀 호출함
-    if startInPt[0] > endInPt[0] or startInPt[1] > endInPt[1]:
-        return createRandomRotatedSharpRect(imgSize, rectColor, thickness)
-    cv2.rectangle(rectImg, startPt, endPt, cvRectColor, -1)
-    cv2.rectangle(rectImg, startInPt, endInPt, (0,0,0), -1)
-    # 회전할 각도
-    rotDeg = rd.randrange(0, 90, 15)
-    rotMatrix = cv2.getRotationMatrix2D(centerPt, rotDeg, 1)
-    rotRectImg = cv2.warpAffine(rectImg, rotMatrix, imgSize)
-    return cv2.cvtColor(rotRectImg, cv2.COLOR_BGR2RGB)
+    rectImg = np.zeros(imgSize + (3,), np.uint8)
+    return drawShape(rectImg, _getRandomRotatedSharpRectShape(imgSize, thickness, rng), rectColor)
 
-def _getRandomCircleInfo(imgSize, thickness, inPadding = None):
+def _getMaxCircleRadius(imgSize, thickness):
+    """_getRandomCircleInfo에서 나올 수 있는 반지름의 상한 (미포함)
+    thickness가 np.ndarray이면 원소별로 계산함
     """
+    padding = (thickness // 2 + 1)
+    shortLength = min(imgSize[:2])
+    # 중심점 범위가 비지 않는 조건 : 2 * (radius + padding) < shortLength
+    maxRadius = np.minimum(shortLength // 2 - 2 * padding, (shortLength - 2 * padding + 1) // 2)
+    return int(maxRadius) if 0 == np.ndim(maxRadius) else maxRadius
+
+def _getRandomCircleInfo(imgSize, thickness, inPadding = None, rng = None):
+    """반지름과 중심점을 유효한 범위 안에서 바로 뽑음
     args
-        imgSize : tuple (width, height)
+        imgSize : tuple 이미지 모양은 imgSize + (3,)
         thickness : int
         inPadding : custom inPadding : int
+        rng : np.random.Generator or None
     return
         centerPoint : tuple (center x, center y)
         radius : int
     """
     padding = (thickness // 2 + 1)
-    shortLength = min(imgSize)
-    maxRadius = shortLength // 2 - 2 * padding
+    maxRadius = _getMaxCircleRadius(imgSize, thickness)
     minPadding = inPadding if inPadding is not None and inPadding >= padding else padding
-    radius = rd.randrange(minPadding, maxRadius)
+    if minPadding >= maxRadius:
+        raise ValueError("image size {} is too small for thickness {}".format(imgSize, thickness))
+    radius = _randrange(rng, minPadding, maxRadius)
     # 회전 중심점 좌표의 범위 구하기
     minCenterPos = radius + padding
-    maxCenterPosX = imgSize[0] - radius - padding
-    maxCenterPosY = imgSize[1] - radius - padding
-    if minCenterPos >= maxCenterPosX or minCenterPos >= maxCenterPosY:
-        return _getRandomCircleInfo(imgSize, thickness)
-    centerX = rd.randrange(minCenterPos, maxCenterPosX)
-    centerY = rd.randrange(minCenterPos, maxCenterPosY)
+    maxCenterPosX = imgSize[1] - radius - padding
+    maxCenterPosY = imgSize[0] - radius - padding
+    centerX = _randrange(rng, minCenterPos, maxCenterPosX)
+    centerY = _randrange(rng, minCenterPos, maxCenterPosY)
     centerPt = (centerX, centerY)
     return centerPt, radius
 
+def _getShapeMask(imgFrame, thresholdRange = (50, 255)):
+    """도형 이미지를 1채널 마스크로 만듬, 이미 1채널이면 threshold만 함
+    args
+        imgFrame : np.ndarray (rows, cols) or (rows, cols, 3)
+        thresholdRange : tuple (min, max)
+    return
+        shapeMask : np.ndarray uint8 (rows, cols)
+    """
+    grayImg = imgFrame if 2 == imgFrame.ndim else cv2.cvtColor(imgFrame, cv2.COLOR_BGR2GRAY)
+    thresholdMin, thresholdMax = thresholdRange
+    _, shapeMask = cv2.threshold(grayImg, thresholdMin, thresholdMax, cv2.THRESH_BINARY)
+    return shapeMask
+
 def overDrawImg(bgImg, fgImg, imgFrame, thresholdRange = (50, 255)):
     """bgImg 위에 fgImg를 imgFrame 모양에 맞게 붙임
     args
         bgImg : back ground image : np.ndarray
         fgImg : front image : np.ndarray
-        imgFrame : mask image : np.ndarray
+        imgFrame : mask image : np.ndarray (1채널 혹은 3채널)
         thresholdRange : threshold range : tuple (min, max)
     return
         retImg : result image : np.ndarray
     """
-    grayImg = cv2.cvtColor(imgFrame, cv2.COLOR_BGR2GRAY)
-    thresholdMin, thresholdMax = thresholdRange
-    _, shapeMask = cv2.threshold(grayImg, thresholdMin, thresholdMax, cv2.THRESH_BINARY)
-    shapeMask_inv = cv2.bitwise_not(shapeMask)
-    tmpImg = bgImg.copy()
-    tmpBgImg = cv2.bitwise_and(tmpImg, tmpImg, mask = shapeMask_inv)
-    tmpImg = fgImg.copy()
-    tmpFgImg = cv2.bitwise_and(tmpImg, tmpImg, mask = shapeMask)
-    retImg = cv2.add(tmpBgImg, tmpFgImg)
-    return retImg
+    retImg = bgImg.copy()
+    return overDrawImgInPlace(retImg, _getShapeMask(imgFrame, thresholdRange), fgImg)
+
+def overDrawImgInPlace(bgImg, shapeMask, fg):
+    """bgImg 버퍼에 직접 fg를 shapeMask 모양으로 덮어씀
+    복사본, 중간 이미지, 색 변환 없이 마스크 영역의 픽셀만 바꿈
+    args
+        bgImg : back ground image : np.ndarray (rows, cols, 3), 결과가 여기에 써짐
+        shapeMask : 1채널 마스크 : np.ndarray (rows, cols), 0이 아닌 곳에 그림
+        fg : 색 tuple (R, G, B) or 이미지 np.ndarray (rows, cols, 3)
+    return
+        bgImg : np.ndarray
+    """
+    assert isinstance(bgImg, np.ndarray) and 2 == shapeMask.ndim
+    assert bgImg.shape[:2] == shapeMask.shape
+    if isinstance(fg, np.ndarray) and fg.shape == bgImg.shape:
+        cv2.copyTo(fg, shapeMask, bgImg)
+    else:
+        bgImg[shapeMask != 0] = fg
+    return bgImg
 
-def createRandomTriangle(imgSize = (300, 300), figColor = (255, 255, 255), thickness = 1):
+def createRandomTriangle(imgSize = (300, 300), figColor = (255, 255, 255), thickness = 1, rng = None):
     """
     args
         imgSize : tuple (width, height)
         figColor : tuple (R, G, B)
         thickness : int
+        rng : np.random.Generator or None => 전역 random 모듈
     return
         triangle image : np.ndarray (R, G, B)
     """
-    padding = (thickness // 2 + 1) if thickness > 0 else 1
-    shortLength = min(imgSize)
-    minPos = padding
-    maxPosX = imgSize[0] - padding
-    maxPosY = imgSize[1] - padding
-    ptList = []
-    for itPt in range(3):
-        ptList.append([rd.randrange(minPos, maxPosX), rd.randrange(minPos, maxPosY)])
-    ptNp = np.array(ptList, np.int32)
-    # 폴리곤 그리기로 삼각형 그리기
-    imgShape = imgSize + (3,)
-    triangleImg = np.zeros(imgShape, np.uint8)
-    cvFigColor = figColor[::-1]
-    if 0 > thickness:
-        cv2.fillPoly(triangleImg, [ptNp], cvFigColor)
-    else:
-        cv2.polylines(triangleImg, [ptNp], True, cvFigColor, thickness)
-    return cv2.cvtColor(triangleImg, cv2.COLOR_BGR2RGB)
+    triangleImg = np.zeros(imgSize + (3,), np.uint8)
+    return drawShape(triangleImg, _getRandomTriangleShape(imgSize, thickness, rng), figColor)
 
-def getRandomColor(inten = 51):
+def getRandomColor(inten = 51, rng = None):
     """랜덤 RGB 값을 반환함
     args
         inten : int [0, 255]
+        rng : np.random.Generator or None
     return 
         color : tuple (R, G, B) or (B, G, R)
     """
-    return (rd.randrange(0, 256, inten),
-            rd.randrange(0, 256, inten),
-            rd.randrange(0, 256, inten))
+    return (_randrange(rng, 0, 256, inten),
+            _randrange(rng, 0, 256, inten),
+            _randrange(rng, 0, 256, inten))
 
-def gaussNoisy(img, var):
-    """NOTE: 미완성 메서드
-    가우스 노이즈 가우스 음의 값은 아직 연산을 하지 못함 개선이 필요함
+def gaussNoisy(img, var, rng = None):
+    """가우스 노이즈, float32로 계산하고 [0, 255]로 포화시킴
+    batch 단위 처리는 noiseTools.NoiseAugmenter를 사용
     args
-        img : np.ndarray
-        v
+        img : np.ndarray uint8
+        var : 분산
+        rng : np.random.Generator or None => 전역 np.random
+    return
+        noisy : np.ndarray uint8
     """
     assert isinstance(img, np.ndarray)
     assert var > 0
-    mean = 0
     sigma = var ** 0.5
-    gauss = np.random.normal(mean, sigma, img.shape).astype("u1")
-    noisy = cv2.add(img, gauss)
-    return noisy
+    if rng is None:
+        gauss = np.random.standard_normal(img.shape).astype(np.float32)
+    else:
+        gauss = rng.standard_normal(img.shape, dtype=np.float32)
+    gauss *= sigma
+    gauss += img
+    np.clip(gauss, 0, 255, out=gauss)
+    return np.rint(gauss).astype(np.uint8)
 
 # 고수준 메서드
-def createRandomColorCircle(imgSize = (300, 300), thickRange = (0, 20)):
-    """색상이 들어 있는 컬러 원 혹은 링을 그림
+def _getRandomThick(thickRange, rng):
+    """thickRange 범위의 두께, 0 이하는 -1(채움)
     """
     assert 2 == len(thickRange)
     minThick, maxThick = min(thickRange), max(thickRange)
-    thick = rd.randrange(minThick, maxThick)
-    thick = thick if thick > 0 else -1
-    ringFrame = createRandomCircle(imgSize, thickness=thick)
-    imgShape = imgSize + (3,)
-    bgImg = np.zeros(imgShape, np.uint8)
-    bgImg[:] = getRandomColor()
-    fgImg = np.zeros(imgShape, np.uint8)
-    fgImg[:] = getRandomColor()
-    return overDrawImg(bgImg, fgImg, ringFrame)
-
-def overDrawRandomColorCircle(bgImg, thickRange = (1, 20)):
+    thick = _randrange(rng, minThick, maxThick)
+    return thick if thick > 0 else -1
+
+def _getOverThickRange(thickRange):
+    """덧그리는 도형의 두께 범위, 최소 두께가 1이고 비어 있지 않음
+        ex) (0, 20) => (1, 20), (0, 1) => (1, 2)
+    """
+    minThick = max(1, min(thickRange))
+    return (minThick, max(max(thickRange), minThick + 1))
+
+def createRandomColorCircle(imgSize = (300, 300), thickRange = (0, 20), rng = None):
+    """색상이 들어 있는 컬러 원 혹은 링을 그림
+    """
+    thick = _getRandomThick(thickRange, rng)
+    ringMask, _ = createRandomCircleMask(imgSize, thick, rng)
+    bgImg = np.empty(imgSize + (3,), np.uint8)
+    bgImg[:] = getRandomColor(rng=rng)
+    return overDrawImgInPlace(bgImg, ringMask, getRandomColor(rng=rng))
+
+def overDrawRandomColorCircle(bgImg, thickRange = (1, 20), rng = None, inPlace = False):
     """이미지 위에 랜덤 색상의 랜덤 링을 그린다
+    inPlace가 True이면 bgImg에 바로 그림
     """
     assert isinstance(bgImg, np.ndarray)
-    assert 2 == len(thickRange)
-    minThick, maxThick = min(thickRange), max(thickRange)
-    thick = rd.randrange(minThick, maxThick)
-    thick = thick if thick > 0 else -1
-    ringFrame = createRandomCircle(bgImg.shape[:2], thickness=thick)
-    fgImg = np.zeros(bgImg.shape, np.uint8)
-    fgImg[:] = getRandomColor()
-    return overDrawImg(bgImg, fgImg, ringFrame)
-
-def createRandomRotatedColorRect(imgSize = (300, 300), thickRange = (0, 20)):
+    thick = _getRandomThick(thickRange, rng)
+    ringMask, _ = createRandomCircleMask(bgImg.shape[:2], thick, rng)
+    dstImg = bgImg if inPlace else bgImg.copy()
+    return overDrawImgInPlace(dstImg, ringMask, getRandomColor(rng=rng))
+
+def createRandomRotatedColorRect(imgSize = (300, 300), thickRange = (0, 20), rng = None):
     """임의의 색 배경에 임의의 색 외곽선의 회전하는 사각형
     """
-    assert 2 == len(thickRange)
-    minThick, maxThick = min(thickRange), max(thickRange)
-    thick = rd.randrange(minThick, maxThick)
-    thick = thick if thick > 0 else -1
-    rectFrame = createRandomRotatedSharpRect(imgSize, thickness=thick)
-    imgShape = imgSize + (3,)
-    bgImg = np.zeros(imgShape, np.uint8)
-    bgImg[:] = getRandomColor()
-    fgImg = np.zeros(imgShape, np.uint8)
-    fgImg[:] = getRandomColor()
-    return overDrawImg(bgImg, fgImg, rectFrame)
-
-def overDrawRandomRotatedColorRect(bgImg, thickRange = (1, 20)):
+    thick = _getRandomThick(thickRange, rng)
+    rectMask, _ = createRandomRotatedSharpRectMask(imgSize, thick, rng)
+    bgImg = np.empty(imgSize + (3,), np.uint8)
+    bgImg[:] = getRandomColor(rng=rng)
+    return overDrawImgInPlace(bgImg, rectMask, getRandomColor(rng=rng))
+
+def overDrawRandomRotatedColorRect(bgImg, thickRange = (1, 20), rng = None, inPlace = False):
     """임의의 색 배경에 임의의 색 외곽선의 회전된 사각형 위에 동일한거 덧 그리기
+    inPlace가 True이면 bgImg에 바로 그림
     """
     assert isinstance(bgImg, np.ndarray)
-    assert 2 == len(thickRange)
-    minThick, maxThick = min(thickRange), max(thickRange)
-    thick = rd.randrange(minThick, maxThick)
-    thick = thick if thick > 0 else -1
-    rectFrame = createRandomRotatedSharpRect(bgImg.shape[:2], thickness=thick)
-    fgImg = np.zeros(bgImg.shape, np.uint8)
-    fgImg[:] = getRandomColor()
-    return overDrawImg(bgImg, fgImg, rectFrame)
-
-def getFigureImageData(imgSize = (300, 300), answer = 0, maxOverDraw = 2):
+    thick = _getRandomThick(thickRange, rng)
+    rectMask, _ = createRandomRotatedSharpRectMask(bgImg.shape[:2], thick, rng)
+    dstImg = bgImg if inPlace else bgImg.copy()
+    return overDrawImgInPlace(dstImg, rectMask, getRandomColor(rng=rng))
+
+# 도형 종류별 도형 정보 생성 함수
+_SHAPE_SAMPLER_DICT = {
+    "circle": _getRandomCircleShape,
+    "rect": _getRandomRotatedRectShape,
+    "sharpRect": _getRandomRotatedSharpRectShape,
+    "triangle": _getRandomTriangleShape,
+}
+
+def getRandomShapeSpec(shapeType, imgSize = (300, 300), thickness = 1, color = None, rng = None):
+    """composeFigureScene에 넣을 랜덤 도형 정보
+    args
+        shapeType : "circle", "rect", "sharpRect", "triangle"
+        imgSize : tuple
+        thickness : int, 음수이면 채운 도형
+        color : tuple (R, G, B) or None => 랜덤 색
+        rng : np.random.Generator or None
+    return
+        shape : 도형 정보 dict, "color" 포함
+    """
+    shape = _SHAPE_SAMPLER_DICT[shapeType](imgSize, thickness, rng)
+    shape["color"] = getRandomColor(rng=rng) if color is None else tuple(color)
+    return shape
+
+def composeFigureScene(shapeList, imgSize = (300, 300), bgColor = (0, 0, 0), out = None, labelMap = None):
+    """도형 정보 목록을 z 순서(앞에서부터)대로 하나의 버퍼에 바로 그림
+    도형마다 그려지는 픽셀만 건드리므로 비용은 도형 면적에 비례함
+    args
+        shapeList : list of 도형 정보 dict ("color" 포함)
+        imgSize : tuple
+        bgColor : tuple (R, G, B)
+        out : np.ndarray uint8 imgSize + (3,) or None
+        labelMap : np.ndarray int32 imgSize or None
+    return
+        img : np.ndarray uint8 (R, G, B)
+        labelMap : np.ndarray int32, 0은 배경, i + 1은 shapeList[i]가 보이는 픽셀
+    """
+    imgShape = tuple(imgSize[:2])
+    img = np.empty(imgShape + (3,), np.uint8) if out is None else out
+    labelMap = np.empty(imgShape, np.int32) if labelMap is None else labelMap
+    assert img.shape == imgShape + (3,) and labelMap.shape == imgShape
+    img[:] = bgColor
+    labelMap[:] = 0
+    for itNum, itShape in enumerate(shapeList):
+        drawShape(img, itShape, itShape["color"])
+        drawShape(labelMap, itShape, itNum + 1)
+    return img, labelMap
+
+def _getFigureSceneSpecs(imgSize, answer, maxOverDraw, rng, thickRange):
+    """getFigureImageData용 배경색과 도형 정보 목록
+    """
+    assert answer in (0, 1)
+    shapeType = "sharpRect" if 0 == answer else "circle"
+    overThickRange = _getOverThickRange(thickRange)
+    countOverDraw = _randrange(rng, 0, maxOverDraw)
+    bgColor = None
+    shapeList = []
+    for itCount in range(countOverDraw + 1):
+        # 덧그리는 도형은 두께가 1 이상
+        thick = _getRandomThick(thickRange if 0 == itCount else overThickRange, rng)
+        shape = _SHAPE_SAMPLER_DICT[shapeType](imgSize, thick, rng)
+        if 0 == itCount:
+            bgColor = getRandomColor(rng=rng)
+        shape["color"] = getRandomColor(rng=rng)
+        shapeList.append(shape)
+    return bgColor, shapeList
+
+def getFigureImageDataWithGt(imgSize = (300, 300), answer = 0, maxOverDraw = 2, rng = None, thickRange = (0, 20)):
+    """getFigureImageData와 같은 이미지에 도형별 마스크와 bounding box를 같이 반환함
+    마스크는 가려진 부분을 포함한 도형 전체, 순서는 그린 순서
+    args
+        imgSize : tuple
+        answer : int (0 : 사각형, 1 : 원)
+        maxOverDraw : int
+        rng : np.random.Generator or None
+        thickRange : 첫 도형의 두께 범위, 덧그리는 도형은 최소 두께가 1
+    return
+        img : np.ndarray (R, G, B)
+        shapeMasks : np.ndarray uint8 (count, rows, cols) {0, 255}
+        bboxes : np.ndarray int32 (count, 4) (x, y, width, height)
+    """
+    bgColor, shapeList = _getFigureSceneSpecs(imgSize, answer, maxOverDraw, rng, thickRange)
+    img, _ = composeFigureScene(shapeList, imgSize, bgColor)
+    maskList, bboxList = zip(*[_renderShapeMask(imgSize, itShape) for itShape in shapeList])
+    return img, np.stack(maskList), np.array(bboxList, np.int32)
+
+def getFigureImageData(imgSize = (300, 300), answer = 0, maxOverDraw = 2, rng = None, thickRange = (0, 20)):
     """임의의 도형 출력 해주는 함수
     """
     assert isinstance(answer, int)
-    # 사각형인 경우
-    countOverDraw = rd.randrange(maxOverDraw)
-    img = None
-    if 0 == answer:
-        img = createRandomRotatedColorRect(imgSize)
-        for itCount in range(countOverDraw):
-            img = overDrawRandomRotatedColorRect(img)
-    elif 1 == answer:
-        img = createRandomColorCircle(imgSize)
-        for itCount in range(countOverDraw):
-            img = overDrawRandomColorCircle(img)
+    if answer not in (0, 1):
+        return None
+    bgColor, shapeList = _getFigureSceneSpecs(imgSize, answer, maxOverDraw, rng, thickRange)
+    img, _ = composeFigureScene(shapeList, imgSize, bgColor)
     return img
 
+# 배치 메서드
+def _getBatchThickness(rng, count, thickRange):
+    """thickRange 범위의 두께를 count 만큼 뽑음, 0 이하는 -1(채움)으로 바꿈
+    """
+    minThick, maxThick = min(thickRange), max(thickRange)
+    thicks = rng.integers(minThick, maxThick, size=count)
+    thicks[thicks <= 0] = -1
+    return thicks
+
+def _getBatchCircleInfo(rng, imgShape, thicks, minRadius = None):
+    """_getRandomCircleInfo의 배치 버전, 재귀 없이 유효한 범위 안에서 바로 뽑음
+    args
+        rng : np.random.Generator
+        imgShape : tuple (rows, cols)
+        thicks : np.ndarray (count,)
+        minRadius : np.ndarray (count,) or None
+    return
+        centerX, centerY, radius : np.ndarray (count,)
+    """
+    rows, cols = imgShape
+    padding = thicks // 2 + 1
+    maxRadius = _getMaxCircleRadius(imgShape, thicks)
+    lowRadius = padding if minRadius is None else np.maximum(padding, minRadius)
+    if np.any(lowRadius >= maxRadius):
+        raise ValueError("image size {} is too small for thickness {}".format(imgShape, int(thicks[np.argmax(lowRadius >= maxRadius)])))
+    radius = lowRadius + (rng.random(thicks.shape[0]) * (maxRadius - lowRadius)).astype(np.int64)
+    minCenterPos = radius + padding
+    centerX = minCenterPos + (rng.random(thicks.shape[0]) * (cols - radius - padding - minCenterPos)).astype(np.int64)
+    centerY = minCenterPos + (rng.random(thicks.shape[0]) * (rows - radius - padding - minCenterPos)).astype(np.int64)
+    return centerX, centerY, radius
+
+def _getBatchCircleShapes(rng, imgShape, thicks):
+    """원 도형 정보 목록, 정보는 한번에 뽑음
+    """
+    centerX, centerY, radius = _getBatchCircleInfo(rng, imgShape, thicks)
+    return [{"type": "circle", "center": (int(itX), int(itY)), "radius": int(itRadius), "thickness": int(itThick)}
+            for itX, itY, itRadius, itThick in zip(centerX, centerY, radius, thicks)]
+
+def _getBatchSharpRectShapes(rng, imgShape, thicks):
+    """_getRandomRotatedSharpRectShape의 배치 버전 사각형 정보 목록
+    속 사각형이 남는 각도 중에서만 뽑고, 남을 수 있는 각도가 없으면 채운 사각형
+    """
+    count = thicks.shape[0]
+    rectDegs = np.arange(10, 90, 10)
+    rectRadians = np.deg2rad(rectDegs)
+    shortRate = np.minimum(np.cos(rectRadians), np.sin(rectRadians))
+    # (count, 각도 수) 각도별 최소 반지름
+    minRadiusTable = np.ceil(np.maximum(thicks, 0)[:, None] / shortRate[None, :]).astype(np.int64) + 1
+    isPossible = (minRadiusTable < _getMaxCircleRadius(imgShape, thicks)[:, None]) & (thicks > 0)[:, None]
+    possibleCount = isPossible.sum(axis=1)
+    thicks = np.where((thicks > 0) & (0 == possibleCount), -1, thicks)
+    pick = (rng.random(count) * np.maximum(possibleCount, 1)).astype(np.int64)
+    degIndex = np.argmax(np.cumsum(isPossible, axis=1) > pick[:, None], axis=1)
+    # 채운 사각형은 각도 제한이 없음
+    isFilled = thicks < 0
+    degIndex[isFilled] = rng.integers(0, rectDegs.shape[0], size=int(isFilled.sum()))
+    minRadius = np.where(isFilled, 0, minRadiusTable[np.arange(count), degIndex])
+    centerX, centerY, radius = _getBatchCircleInfo(rng, imgShape, thicks, minRadius)
+    rotDegs = 15 * rng.integers(0, 6, size=count)
+    shapeList = []
+    for itNum in range(count):
+        centerPt = (centerX[itNum], centerY[itNum])
+        rectRadian = rectRadians[degIndex[itNum]]
+        halfWidth, halfHeight = radius[itNum] * np.cos(rectRadian), radius[itNum] * np.sin(rectRadian)
+        outPts = _getRotatedRectPoints(centerPt, halfWidth, halfHeight, rotDegs[itNum])
+        inPts = None
+        if not isFilled[itNum]:
+            inPts = _getRotatedRectPoints(centerPt, halfWidth - thicks[itNum], halfHeight - thicks[itNum], rotDegs[itNum])
+        shapeList.append({"type": "rect", "points": outPts, "thickness": -1, "holePoints": inPts})
+    return shapeList
+
+def getFigureImageBatch(n, imgSize = (300, 300), answers = None, maxOverDraw = 2, out = None, rng = None, chunkSize = 64, thickRange = (0, 20)):
+    """getFigureImageData의 배치 버전
+    도형 정보는 chunkSize 단위로 numpy로 한번에 뽑고, 도형은 하나의 uint8 배열의 칸마다 cv2로 바로 그림
+    그리는 비용은 도형 면적에 비례함
+    args
+        n : int
+        imgSize : tuple 기존 함수들과 같이 이미지 모양은 imgSize + (3,)
+        answers : None => 랜덤, int => 모두 같은 도형, sequence => 이미지별 도형 (0 : 사각형, 1 : 원)
+        maxOverDraw : int
+        out : np.ndarray uint8 (n,) + imgSize + (3,) or None, out[i]가 C 연속이어야 함
+        rng : np.random.Generator or None
+        chunkSize : 한번에 도형 정보를 뽑을 이미지 수
+        thickRange : 첫 도형의 두께 범위, 덧그리는 도형은 최소 두께가 1
+    return
+        out : np.ndarray uint8 (n,) + imgSize + (3,)
+        labels : np.ndarray int (n,)
+    """
+    assert n > 0 and maxOverDraw > 0
+    rng = np.random.default_rng() if rng is None else rng
+    imgShape = tuple(imgSize[:2])
+    if out is None:
+        out = np.empty((n,) + imgShape + (3,), np.uint8)
+    assert isinstance(out, np.ndarray) and np.uint8 == out.dtype
+    assert out.shape == (n,) + imgShape + (3,)
+    # cv2로 out[i]에 바로 그리므로 이미지 한 장은 C 연속이어야 함 (ex : buf[..., :3]는 안 됨)
+    assert out[0].flags.c_contiguous, "out[i] must be C-contiguous"
+    if answers is None:
+        labels = rng.integers(0, 2, size=n)
+    else:
+        labels = np.broadcast_to(np.asarray(answers, dtype=np.int64), (n,)).copy()
+    assert np.all((0 == labels) | (1 == labels))
+    overThickRange = _getOverThickRange(thickRange)
+    for itStart in range(0, n, chunkSize):
+        chunkImgs = out[itStart:itStart + chunkSize]
+        chunkLabels = labels[itStart:itStart + chunkSize]
+        count = chunkLabels.shape[0]
+        # 배경색과 덧그릴 횟수
+        # 3채널 색을 바로 broadcast 하면 느리므로 첫 픽셀 => 첫 줄 => 전체 순서로 복사함
+        chunkImgs[:, 0, 0] = (rng.integers(0, 6, size=(count, 3)) * 51).astype(np.uint8)
+        chunkImgs[:, 0, 1:] = chunkImgs[:, 0, :1]
+        chunkImgs[:, 1:] = chunkImgs[:, :1]
+        countOverDraw = rng.integers(0, maxOverDraw, size=count)
+        for itLayer in range(maxOverDraw):
+            # 덧그리는 도형은 두께가 1 이상
+            layerThickRange = thickRange if 0 == itLayer else overThickRange
+            for itAnswer in (0, 1):
+                drawIndex = np.flatnonzero((chunkLabels == itAnswer) & (countOverDraw >= itLayer))
+                if 0 == drawIndex.shape[0]:
+                    continue
+                thicks = _getBatchThickness(rng, drawIndex.shape[0], layerThickRange)
+                if 0 == itAnswer:
+                    shapeList = _getBatchSharpRectShapes(rng, imgShape, thicks)
+                else:
+                    shapeList = _getBatchCircleShapes(rng, imgShape, thicks)
+                colors = (rng.integers(0, 6, size=(drawIndex.shape[0], 3)) * 51).tolist()
+                for itIndex, itShape, itColor in zip(drawIndex, shapeList, colors):
+                    drawShape(chunkImgs[itIndex], itShape, itColor)
+    return out, labels
+
 if __name__ == "__main__":
     img = createRandomSharpCircle(thickness=5)
     plt.imshow(img)
@@ -0,0 +1,244 @@
+import os
+import json
+import cv2
+import numpy as np
+
+__version__ = 0.1
+
+# 중복 / 유사 이미지 검사용 perceptual hash
+# hash는 모두 64 bit (np.uint64)
+
+def _packBits(bits):
+    """64개의 bool을 uint64 하나로 묶음
+    """
+    return np.packbits(bits.reshape(-1)).view(">u8").astype(np.uint64)[0]
+
+def _toGray(img):
+    if 2 == img.ndim:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+def getAverageHash(img):
+    """aHash : 8x8로 줄인 뒤 평균보다 밝은지
+    args
+        img : np.ndarray (rows, cols) or (rows, cols, 3) BGR
+    return
+        hash : np.uint64
+    """
+    smallImg = cv2.resize(_toGray(img), (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return _packBits(smallImg > smallImg.mean())
+
+def getDifferenceHash(img):
+    """dHash : 9x8로 줄인 뒤 가로로 옆 픽셀보다 밝은지
+    args
+        img : np.ndarray (rows, cols) or (rows, cols, 3) BGR
+    return
+        hash : np.uint64
+    """
+    smallImg = cv2.resize(_toGray(img), (9, 8), interpolation=cv2.INTER_AREA)
+    return _packBits(smallImg[:, 1:] > smallImg[:, :-1])
+
+def getPerceptualHash(img):
+    """pHash : 32x32의 DCT 저주파 8x8 계수가 중간값보다 큰지
+    args
+        img : np.ndarray (rows, cols) or (rows, cols, 3) BGR
+    return
+        hash : np.uint64
+    """
+    smallImg = cv2.resize(_toGray(img), (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    lowFreq = cv2.dct(smallImg)[:8, :8]
+    # DC 성분은 중간값 계산에서 뺌
+    return _packBits(lowFreq > np.median(lowFreq.reshape(-1)[1:]))
+
+HASH_FUNC_DICT = {
+    "ahash": getAverageHash,
+    "dhash": getDifferenceHash,
+    "phash": getPerceptualHash,
+}
+
+def _getFileHash(imgFilePath, method):
+    """파일 하나의 hash, 읽을 수 없으면 None
+    """
+    img = cv2.imread(imgFilePath, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    return HASH_FUNC_DICT[method](img)
+
+def computeImageHashes(imgFilePathList, method = "dhash", workers = 4):
+    """이미지 파일들의 hash를 thread pool로 구함
+    args
+        imgFilePathList : list of str
+        method : "ahash", "dhash", "phash"
+        workers : thread 개수
+    return
+        hashes : np.ndarray uint64 (n,)
+        isValid : np.ndarray bool (n,), 읽지 못한 파일은 False
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    assert method in HASH_FUNC_DICT
+    hashes = np.zeros(len(imgFilePathList), np.uint64)
+    isValid = np.zeros(len(imgFilePathList), bool)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for itIndex, itHash in enumerate(executor.map(_getFileHash, imgFilePathList, [method] * len(imgFilePathList))):
+            if itHash is not None:
+                hashes[itIndex] = itHash
+                isValid[itIndex] = True
+    return hashes, isValid
+
+# 0 ~ 255의 1인 bit 개수
+_POPCOUNT_TABLE = np.array([bin(itVal).count("1") for itVal in range(256)], np.uint8)
+
+def getHammingDistance(hashesA, hashesB):
+    """broadcast 가능한 두 uint64 배열의 bit 차이 개수
+    return
+        np.ndarray uint8
+    """
+    xorHashes = np.bitwise_xor(np.asarray(hashesA, np.uint64), np.asarray(hashesB, np.uint64))
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xorHashes)
+    xorBytes = np.ascontiguousarray(xorHashes).view(np.uint8).reshape(xorHashes.shape + (8,))
+    return _POPCOUNT_TABLE[xorBytes].sum(axis=-1, dtype=np.uint8)
+
+class ImageHashIndex:
+    """hash 목록에서 가까운 hash를 찾는 index
+    maxDist가 작으면 64 bit를 maxDist + 1 조각으로 나눈 multi-index로 후보만 비교하고
+    (거리가 maxDist 이하면 적어도 한 조각은 같음) 아니면 block 단위로 전부 비교함
+        ex) maxDist 4 => 13, 13, 13, 13, 12 bit의 5조각
+    조각이 12 bit보다 짧아지면 후보가 너무 많아져 전부 비교하는 것보다 느려지므로 5조각까지만 씀
+    """
+    MAX_CHUNK_COUNT = 5
+    HASH_FILE_NAME = "hashes.npy"
+    PATH_FILE_NAME = "paths.json"
+
+    def __init__(self, hashes, pathList = None, method = "dhash"):
+        """
+        args
+            hashes : np.ndarray uint64 (n,)
+            pathList : list of str or None
+            method : hash 종류
+        """
+        self.hashes = np.asarray(hashes, np.uint64)
+        self.pathList = pathList
+        self.method = method
+        self._chunkTableDict = {}
+
+    @classmethod
+    def fromFiles(cls, imgFilePathList, method = "dhash", workers = 4):
+        """이미지 파일로 index를 만듬, 읽지 못한 파일은 빠짐
+        """
+        hashes, isValid = computeImageHashes(imgFilePathList, method, workers)
+        pathList = [itPath for itPath, itValid in zip(imgFilePathList, isValid) if itValid]
+        return cls(hashes[isValid], pathList, method)
+
+    def save(self, dirPath):
+        """hashes.npy와 paths.json으로 저장함
+        """
+        os.makedirs(dirPath, exist_ok=True)
+        np.save(os.path.join(dirPath, self.HASH_FILE_NAME), self.hashes)
+        with open(os.path.join(dirPath, self.PATH_FILE_NAME), "w", encoding="utf-8") as pathFile:
+            json.dump({"method": self.method, "paths": self.pathList}, pathFile)
+
+    @classmethod
+    def load(cls, dirPath, mmap = True):
+        """save로 저장한 index를 읽음, hash 배열은 memmap으로 열 수 있음
+        """
+        hashes = np.load(os.path.join(dirPath, cls.HASH_FILE_NAME), mmap_mode="r" if mmap else None)
+        with open(os.path.join(dirPath, cls.PATH_FILE_NAME), encoding="utf-8") as pathFile:
+            pathData = json.load(pathFile)
+        return cls(hashes, pathData["paths"], pathData["method"])
+
+    @staticmethod
+    def _getChunkLayout(chunkCount):
+        """64 bit를 chunkCount 조각으로 나눈 조각별 (shift, mask), 앞 조각부터 1 bit씩 더 가짐
+        """
+        layout = []
+        shift = 0
+        for itChunk in range(chunkCount):
+            chunkBits = 64 // chunkCount + (1 if itChunk < 64 % chunkCount else 0)
+            layout.append((np.uint64(shift), np.uint64((1 << chunkBits) - 1)))
+            shift += chunkBits
+        return layout
+
+    def _getChunkTables(self, chunkCount):
+        """조각별 (정렬된 조각 값, 정렬 순서), 조각 수별로 저장해 둠
+        """
+        if chunkCount not in self._chunkTableDict:
+            chunkTables = []
+            for itShift, itMask in self._getChunkLayout(chunkCount):
+                chunkValues = (self.hashes >> itShift) & itMask
+                order = np.argsort(chunkValues, kind="stable")
+                chunkTables.append((chunkValues[order], order))
+            self._chunkTableDict[chunkCount] = chunkTables
+        return self._chunkTableDict[chunkCount]
+
+    def _queryMultiIndex(self, queryHashes, maxDist):
+        """maxDist + 1 조각 중 하나라도 같은 후보 쌍만 만들어 거리를 비교함
+        """
+        chunkCount = maxDist + 1
+        queryList, indexList = [], []
+        for (itShift, itMask), (sortedValues, order) in zip(self._getChunkLayout(chunkCount), self._getChunkTables(chunkCount)):
+            chunkValues = (queryHashes >> itShift) & itMask
+            starts = np.searchsorted(sortedValues, chunkValues, side="left")
+            counts = np.searchsorted(sortedValues, chunkValues, side="right") - starts
+            # 후보 쌍 (query, starts[query] + k), k < counts[query] 를 펼침
+            candidateQuery = np.repeat(np.arange(queryHashes.shape[0]), counts)
+            offsets = np.arange(candidateQuery.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+            queryList.append(candidateQuery)
+            indexList.append(order[starts[candidateQuery] + offsets])
+        # 여러 조각에서 나온 같은 쌍은 하나로 합침
+        pairCodes = np.unique(np.concatenate(queryList).astype(np.int64) * self.hashes.shape[0] + np.concatenate(indexList))
+        candidateQuery, candidateIndex = np.divmod(pairCodes, self.hashes.shape[0])
+        dists = getHammingDistance(queryHashes[candidateQuery], self.hashes[candidateIndex])
+        matched = dists <= maxDist
+        return candidateQuery[matched], candidateIndex[matched], dists[matched]
+
+    def query(self, queryHashes, maxDist = 4, blockSize = 65536):
+        """queryHashes 각각에 대해 maxDist 이하인 index의 항목을 찾음
+        args
+            queryHashes : np.ndarray uint64 (m,)
+            maxDist : int
+            blockSize : 한번에 처리하는 query 개수 (전부 비교할 때는 blockSize * n 크기의 거리 배열을 만듬)
+        return
+            queryIndices, indexIndices, dists : np.ndarray (k,)
+        """
+        queryHashes = np.asarray(queryHashes, np.uint64).reshape(-1)
+        queryList, indexList, distList = [], [], []
+        useMultiIndex = 0 <= maxDist < self.MAX_CHUNK_COUNT
+        if not useMultiIndex:
+            blockSize = max(1, blockSize * 64 // max(1, self.hashes.shape[0]))
+        for itStart in range(0, queryHashes.shape[0], blockSize):
+            blockHashes = queryHashes[itStart:itStart + blockSize]
+            if useMultiIndex:
+                blockQuery, blockIndex, blockDists = self._queryMultiIndex(blockHashes, maxDist)
+            else:
+                dists = getHammingDistance(blockHashes[:, None], self.hashes[None, :])
+                blockQuery, blockIndex = np.nonzero(dists <= maxDist)
+                blockDists = dists[blockQuery, blockIndex]
+            queryList.append(blockQuery + itStart)
+            indexList.append(blockIndex)
+            distList.append(blockDists)
+        if 0 == len(queryList):
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.uint8)
+        return (np.concatenate(queryList).astype(np.int64), np.concatenate(indexList).astype(np.int64),
+                np.concatenate(distList).astype(np.uint8))
+
+    def findDuplicates(self, maxDist = 4):
+        """index 안에서 maxDist 이하인 쌍 (i < j)
+        return
+            pairs : np.ndarray int64 (k, 2)
+            dists : np.ndarray uint8 (k,)
+        """
+        queryIndices, indexIndices, dists = self.query(self.hashes, maxDist)
+        isPair = queryIndices < indexIndices
+        return np.stack([queryIndices[isPair], indexIndices[isPair]], axis=1), dists[isPair]
+
+def findLeakedDuplicates(trainPathList, validPathList, maxDist = 4, method = "dhash", workers = 4):
+    """train과 validation 사이에 겹치는(유사한) 이미지 쌍을 찾음
+    return
+        list of (train path, validation path, dist)
+    """
+    trainIndex = ImageHashIndex.fromFiles(trainPathList, method, workers)
+    validIndex = ImageHashIndex.fromFiles(validPathList, method, workers)
+    queryIndices, indexIndices, dists = trainIndex.query(validIndex.hashes, maxDist)
+    return [(trainIndex.pathList[itIndex], validIndex.pathList[itQuery], int(itDist))
+            for itQuery, itIndex, itDist in zip(queryIndices, indexIndices, dists)]
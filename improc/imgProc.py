@@ -1,59 +1,116 @@
+import os
+import json
+import collections
 import numpy as np
 
 class ColorPixelManager:
     """픽셀 값들을 관리하는 덩어리
+    색마다 픽셀 위치를 CSR 형식으로 저장함
+        colorCodes : 색 코드 (색 코드 순서)
+        pixelIndptr : 색 g의 위치는 pixelOrder[pixelIndptr[g]:pixelIndptr[g + 1]]
+        pixelOrder : 색 코드 순으로 정렬된 flat 위치 (int32, row * cols + col)
+    (row, col) 목록은 요청할 때만 만듬
     """
     def __init__(self, srcImg, isRgb = True):
         """
         args
-            srcImg
-            roi : tuple(start row, start col, end row, end col)
+            srcImg : ROI만 필요하면 잘라서 넘기거나 ColorRoiStats를 사용
             isRgb : True => RGB, False => BGR
         """
         assert isinstance(srcImg, np.ndarray)
         self.rows, self.cols = srcImg.shape[:2]
-        self.pixelDict = {}
-        # for itR in tqdm(range(self.rows)):
-        for itR in range(self.rows):
-            for itC in range(self.cols):
-                colorValue = [str(srcImg.item(itR, itC, itCh)) for itCh in range(srcImg.shape[2])]
-                colorValueStr = ",".join(colorValue)
-                pos = (itR, itC)
-                hasColorValue = False
-                if colorValueStr not in self.pixelDict.keys():
-                    self.pixelDict[colorValueStr] = []
-                self.pixelDict[colorValueStr].append(pos)
+        channels = 1 if 2 == srcImg.ndim else srcImg.shape[2]
+        pixels = srcImg.reshape(-1, channels)
+        self._isPacked = np.uint8 == pixels.dtype and channels <= 4
+        codes = _getColorCodes(pixels)
+        # (색 코드, 위치)를 uint64 하나로 묶어 정렬함, 색 안에서는 row, col 순서가 유지됨
+        sortKeys = (codes.astype(np.uint64) << np.uint64(32)) | np.arange(codes.shape[0], dtype=np.uint64)
+        sortKeys.sort()
+        self.pixelOrder = (sortKeys & np.uint64(0xFFFFFFFF)).astype(np.int32)
+        sortedCodes = (sortKeys >> np.uint64(32)).astype(np.uint32)
+        del sortKeys
+        groupStarts = np.flatnonzero(np.concatenate(([True], sortedCodes[1:] != sortedCodes[:-1])))
+        self.colorCodes = sortedCodes[groupStarts]
+        self.pixelIndptr = np.append(groupStarts, sortedCodes.shape[0]).astype(np.int64)
+        self.pixelCounts = np.diff(self.pixelIndptr)
+        # 처음 나온 순서 (기존 dict의 key 순서)
+        firstPos = self.pixelOrder[groupStarts]
+        self.colorValues = pixels[firstPos]
+        self.keyOrder = np.argsort(firstPos, kind="stable")
 
-    def getPixelPosList(self, color, isRgb = True):
+    def _getKey(self, colorIndex):
+        """색 번호의 "v0,v1,v2" 문자열 key
         """
+        return ",".join(str(itVal) for itVal in self.colorValues[colorIndex].tolist())
+
+    def _getColorIndex(self, color):
+        """color (tuple, list, str)에 해당하는 색 번호, 없으면 None
         """
-        tmpColor = None
-        colorKey = None
-        if isinstance(color, tuple):
-            tmpColor = list(color)
-        elif isinstance(color, list):
-            tmpColor = color
+        if isinstance(color, (tuple, list)):
+            colorValue = list(color)
         elif isinstance(color, str):
-            colorKey = color
+            colorValue = color.split(",")
         else:
             return None
-        if colorKey is None:
-            colorStrList = [str(itVal) for itVal in tmpColor]
-            colorKey = ",".join(colorStrList)
-        if colorKey not in self.pixelDict.keys():
+        try:
+            if isinstance(color, str):
+                # float 이미지의 "0.5,1.0,2.0" 같은 key도 찾을 수 있도록 float으로 읽고 아래에서 dtype과 비교함
+                colorValue = np.array(colorValue, dtype=float)
+            castValue = np.array(colorValue, self.colorValues.dtype)
+            # 범위를 벗어나 값이 바뀌는 색 (ex : 256, -1, 1.5)은 없는 색으로 봄
+            if not np.array_equal(np.array(colorValue), castValue):
+                return None
+        except (ValueError, OverflowError, TypeError):
+            return None
+        colorValue = castValue
+        if colorValue.shape != self.colorValues.shape[1:]:
+            return None
+        if self._isPacked:
+            colorCode = _getColorCodes(colorValue.reshape(1, -1))[0]
+            colorIndex = int(np.searchsorted(self.colorCodes, colorCode))
+            if colorIndex < self.colorCodes.shape[0] and self.colorCodes[colorIndex] == colorCode:
+                return colorIndex
             return None
-        return self.pixelDict[colorKey]
+        matchIndex = np.flatnonzero(np.all(self.colorValues == colorValue, axis=1))
+        return int(matchIndex[0]) if 0 < matchIndex.shape[0] else None
+
+    def getPixelPosArray(self, color, isRgb = True):
+        """특정 색의 flat 위치 배열 (row * cols + col), 복사하지 않은 view
+        return
+            np.ndarray int32 or None
+        """
+        colorIndex = self._getColorIndex(color)
+        if colorIndex is None:
+            return None
+        return self.pixelOrder[self.pixelIndptr[colorIndex]:self.pixelIndptr[colorIndex + 1]]
+
+    def getPixelPosList(self, color, isRgb = True):
+        """
+        """
+        colorIndex = self._getColorIndex(color)
+        return None if colorIndex is None else self._getPosList(colorIndex)
+
+    def _getPosList(self, colorIndex):
+        flatPos = self.pixelOrder[self.pixelIndptr[colorIndex]:self.pixelIndptr[colorIndex + 1]]
+        posRows, posCols = np.divmod(flatPos, self.cols)
+        return list(zip(posRows.tolist(), posCols.tolist()))
     
     def getPixelCount(self, color, isRgb = True):
         """특정한 픽셀을 카운트함
         args
         return
         """
-        return len(self.getPixelPos(color, isRgb))
+        colorIndex = self._getColorIndex(color)
+        return 0 if colorIndex is None else int(self.pixelCounts[colorIndex])
 
+    @property
+    def pixelDict(self):
+        """기존 형식의 {색 key : [(row, col), ...]} dict, 모든 위치를 만드므로 느림
+        """
+        return {self._getKey(itNum): self._getPosList(itNum) for itNum in self.keyOrder}
 
     def getKeys(self):
-        return self.pixelDict.keys()
+        return [self._getKey(itNum) for itNum in self.keyOrder]
 
     def getMinMaxPixel(self):
         """분류된 픽셀중 최대값과 최소 값에 대한 값
@@ -61,23 +118,312 @@ class ColorPixelManager:
             str min
             str max
         """
+        # 처음 나온 순서로 비교해야 같은 개수일 때 기존과 같은 결과가 나옴
+        orderedCounts = self.pixelCounts[self.keyOrder]
         return (
-            min(self.pixelDict.keys(), key=self._callValue),
-            max(self.pixelDict.keys(), key=self._callValue)
+            self._getKey(self.keyOrder[np.argmin(orderedCounts)]),
+            self._getKey(self.keyOrder[np.argmax(orderedCounts)])
         )
-    
-    def _callValue(self, dictKey):
-        """getMinMaxPixel을 위한 콜백 함수
+
+def _getColorCodes(pixels):
+    """(n, channels) 픽셀을 색 하나당 정수 하나로 바꿈
+    uint8이고 4채널 이하이면 uint32로 묶음
+    """
+    if np.uint8 == pixels.dtype and pixels.shape[1] <= 4:
+        codes = np.zeros(pixels.shape[0], np.uint32)
+        for itCh in range(pixels.shape[1]):
+            codes <<= 8
+            codes |= pixels[:, itCh]
+        return codes
+    _, codes = np.unique(pixels, axis=0, return_inverse=True)
+    return codes.reshape(-1)
+
+class ColorRoiStats:
+    """양자화한 색 bin의 integral(summed-area) histogram을 한번 만들어 두고
+    임의의 사각형 ROI의 histogram, 가장 많은/적은 색을 ROI 크기와 상관없이 O(bins)로 구함
+    메모리는 (rows + 1) * (cols + 1) * bins * 4 byte
+    """
+    def __init__(self, srcImg, binsPerChannel = 4):
+        """
+        args
+            srcImg : np.ndarray uint8 (rows, cols) or (rows, cols, channels)
+            binsPerChannel : 채널당 bin 개수, 2의 거듭제곱 [1, 256]
+        """
+        assert isinstance(srcImg, np.ndarray) and np.uint8 == srcImg.dtype
+        assert 0 < binsPerChannel <= 256 and 0 == (binsPerChannel & (binsPerChannel - 1))
+        self.rows, self.cols = srcImg.shape[:2]
+        self.channels = 1 if 2 == srcImg.ndim else srcImg.shape[2]
+        self.binsPerChannel = binsPerChannel
+        self.binCount = binsPerChannel ** self.channels
+        self._shift = 8 - (binsPerChannel.bit_length() - 1)
+        # 픽셀마다 bin 번호
+        binIndex = np.zeros((self.rows, self.cols), np.int32)
+        pixels = srcImg.reshape(self.rows, self.cols, self.channels)
+        for itCh in range(self.channels):
+            binIndex *= binsPerChannel
+            binIndex += pixels[..., itCh] >> self._shift
+        # integral[r, c, b] = [0, r) x [0, c) 안의 bin b 픽셀 수
+        self.integral = np.zeros((self.rows + 1, self.cols + 1, self.binCount), np.int32)
+        for itBin in range(self.binCount):
+            binMask = (binIndex == itBin).astype(np.int32)
+            np.cumsum(binMask, axis=0, out=binMask)
+            np.cumsum(binMask, axis=1, out=self.integral[1:, 1:, itBin])
+
+    def getRoiHistogram(self, roi = None):
+        """ROI 안의 bin별 픽셀 수
+        args
+            roi : tuple(start row, start col, end row, end col) 끝은 미포함, None이면 전체
+        return
+            hist : np.ndarray int32 (bins,)
+        """
+        startRow, startCol, endRow, endCol = (0, 0, self.rows, self.cols) if roi is None else roi
+        assert 0 <= startRow <= endRow <= self.rows and 0 <= startCol <= endCol <= self.cols
+        integral = self.integral
+        return (integral[endRow, endCol] - integral[startRow, endCol]
+                - integral[endRow, startCol] + integral[startRow, startCol])
+
+    def getBinColor(self, binIndex):
+        """bin의 대표색 (bin 가운데 값)
+        return
+            color : tuple
+        """
+        binWidth = 1 << self._shift
+        colorList = []
+        for itCh in range(self.channels):
+            binIndex, quantValue = divmod(int(binIndex), self.binsPerChannel)
+            colorList.append(quantValue * binWidth + binWidth // 2)
+        return tuple(colorList[::-1])
+
+    def getRoiMinMaxColor(self, roi = None):
+        """ROI 안에서 가장 적은 색(0개인 bin 제외)과 가장 많은 색의 대표색
+        args
+            roi : tuple(start row, start col, end row, end col)
+        return
+            minColor : tuple or None
+            maxColor : tuple or None
+        """
+        hist = self.getRoiHistogram(roi)
+        usedBins = np.flatnonzero(hist)
+        if 0 == usedBins.shape[0]:
+            return None, None
+        usedHist = hist[usedBins]
+        return (self.getBinColor(usedBins[np.argmin(usedHist)]),
+                self.getBinColor(usedBins[np.argmax(usedHist)]))
+
+class ColorStatsAggregator:
+    """여러 이미지의 색 통계를 고정 크기 histogram에 누적함
+    이미지 수와 상관없이 메모리가 일정하고 merge로 process별 결과를 합칠 수 있음
+        channelHists : (channels, 256) 채널별 histogram
+        colorHist : 채널당 bitsPerChannel bit로 양자화한 색 histogram
+    채널 순서는 RGB
+    """
+    def __init__(self, bitsPerChannel = 5, channels = 3):
+        """
+        args
+            bitsPerChannel : 색 histogram의 채널당 bit 수 [1, 8]
+            channels : 채널 수
+        """
+        assert 1 <= bitsPerChannel <= 8 and channels * bitsPerChannel <= 24
+        self.bitsPerChannel = bitsPerChannel
+        self.channels = channels
+        self.channelHists = np.zeros((channels, 256), np.int64)
+        self.colorHist = np.zeros(1 << (channels * bitsPerChannel), np.int64)
+        self.imageCount = 0
+        self.failedPaths = []
+
+    def _getHists(self, img):
+        """이미지 하나의 (channelHists, colorHist)
+        """
+        assert np.uint8 == img.dtype and img.shape[2] == self.channels
+        shift = 8 - self.bitsPerChannel
+        channelHists = np.empty_like(self.channelHists)
+        colorIndex = np.zeros(img.shape[:2], np.int32)
+        for itCh in range(self.channels):
+            channelImg = img[..., itCh]
+            channelHists[itCh] = np.bincount(channelImg.ravel(), minlength=256)
+            colorIndex <<= self.bitsPerChannel
+            colorIndex |= channelImg >> shift
+        colorHist = np.bincount(colorIndex.ravel(), minlength=self.colorHist.shape[0])
+        return channelHists, colorHist
+
+    def _addHists(self, channelHists, colorHist):
+        self.channelHists += channelHists
+        self.colorHist += colorHist
+        self.imageCount += 1
+
+    def addImage(self, img, isRgb = True):
+        """이미지 하나를 누적함
+        args
+            img : np.ndarray uint8 (rows, cols, channels)
+            isRgb : True => RGB, False => BGR
+        """
+        self._addHists(*self._getHists(img if isRgb else img[..., ::-1]))
+
+    def addFiles(self, imgFilePathList, workers = 4, maxPending = None):
+        """이미지 파일들을 thread pool에서 decode하고 histogram을 만들어 누적함
+        동시에 처리 중인 이미지는 maxPending 개로 제한됨
+        args
+            imgFilePathList : list of str
+            workers : thread 개수
+            maxPending : 동시에 처리 중인 최대 파일 수, None이면 workers * 2
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        maxPending = workers * 2 if maxPending is None else maxPending
+        pendingQueue = collections.deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for itPath in imgFilePathList:
+                if len(pendingQueue) >= maxPending:
+                    self._foldResult(*pendingQueue.popleft())
+                pendingQueue.append((itPath, executor.submit(self._getFileHists, itPath)))
+            while pendingQueue:
+                self._foldResult(*pendingQueue.popleft())
+
+    def _getFileHists(self, imgFilePath):
+        import cv2
+        img = cv2.imread(imgFilePath, cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        return self._getHists(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+
+    def _foldResult(self, imgFilePath, future):
+        try:
+            result = future.result()
+        except Exception:
+            result = None
+        if result is None:
+            self.failedPaths.append(imgFilePath)
+        else:
+            self._addHists(*result)
+
+    def merge(self, other):
+        """다른 aggregator의 결과를 합침
+        args
+            other : ColorStatsAggregator (같은 설정)
+        return
+            self
+        """
+        assert self.bitsPerChannel == other.bitsPerChannel and self.channels == other.channels
+        self.channelHists += other.channelHists
+        self.colorHist += other.colorHist
+        self.imageCount += other.imageCount
+        self.failedPaths.extend(other.failedPaths)
+        return self
+
+    def getTopColors(self, k = 10):
+        """가장 많은 k개의 색 (양자화 bin의 가운데 값)
+        return
+            list of (color tuple (R, G, B), count)
+        """
+        k = min(k, int(np.count_nonzero(self.colorHist)))
+        if 0 == k:
+            return []
+        topBins = np.argpartition(self.colorHist, -k)[-k:]
+        topBins = topBins[np.argsort(-self.colorHist[topBins], kind="stable")]
+        binWidth = 1 << (8 - self.bitsPerChannel)
+        binMask = (1 << self.bitsPerChannel) - 1
+        colorList = []
+        for itBin in topBins:
+            color = tuple(((int(itBin) >> (self.bitsPerChannel * (self.channels - 1 - itCh))) & binMask) * binWidth + binWidth // 2
+                          for itCh in range(self.channels))
+            colorList.append((color, int(self.colorHist[itBin])))
+        return colorList
+
+    def getChannelStats(self):
+        """채널별 통계
+        return
+            dict : mean, std, min, max (채널별 np.ndarray), pixelCount
         """
-        return len(self.pixelDict[dictKey])
+        values = np.arange(256, dtype=np.float64)
+        pixelCount = int(self.channelHists[0].sum())
+        if 0 == pixelCount:
+            return None
+        mean = self.channelHists @ values / pixelCount
+        std = np.sqrt(self.channelHists @ (values * values) / pixelCount - mean * mean)
+        usedMask = self.channelHists > 0
+        return {
+            "mean": mean,
+            "std": std,
+            "min": np.argmax(usedMask, axis=1),
+            "max": 255 - np.argmax(usedMask[:, ::-1], axis=1),
+            "pixelCount": pixelCount,
+        }
 
 # =======================================================
 # 이미지를 메모리에 load를 해봄으로 이미지가 영상인지 확인함
-def checkImageFiles(imgFilePathList, logFilePath=None):
+# 확인 단계, 뒤로 갈수록 엄격함
+#   header : 파일 헤더만 읽음
+#   verify : PIL verify()로 파일 구조 확인
+#   decode : 픽셀 데이터를 모두 decode 함 (잘린 파일도 찾음)
+CHECK_MODE_LIST = ["header", "verify", "decode"]
+
+ImageCheckResult = collections.namedtuple("ImageCheckResult", ["index", "path", "isOk", "errorType", "errorMessage"])
+
+def _checkImageFile(imgFilePath, mode):
+    """이미지 하나를 확인함, process pool에서도 실행됨
+    return
+        (isOk, errorType, errorMessage)
+    """
+    from PIL import Image
+    try:
+        with Image.open(imgFilePath) as tmpImg:
+            if "verify" == mode:
+                tmpImg.verify()
+            elif "decode" == mode:
+                tmpImg.load()
+    except Exception as ex:
+        return False, type(ex).__name__, str(ex)
+    return True, None, None
+
+def _getFileStamp(imgFilePath):
+    """manifest에서 파일이 바뀌었는지 비교하는 값
+    """
+    try:
+        fileStat = os.stat(imgFilePath)
+    except OSError:
+        return None
+    return [fileStat.st_size, fileStat.st_mtime_ns]
+
+def _loadCheckManifest(manifestPath):
+    if manifestPath is None or not os.path.isfile(manifestPath):
+        return {}
+    with open(manifestPath, encoding="utf-8") as manifestFile:
+        return json.load(manifestFile)
+
+def _saveCheckManifest(manifestPath, manifestData):
+    tmpPath = manifestPath + ".tmp"
+    with open(tmpPath, "w", encoding="utf-8") as manifestFile:
+        json.dump(manifestData, manifestFile)
+    os.replace(tmpPath, manifestPath)
+
+def _getCachedCheck(manifestData, imgFilePath, fileStamp, mode):
+    """manifest에 같은 파일을 같거나 더 엄격한 단계로 확인한 결과가 있으면 반환함
+    실패한 결과는 같은 단계 이상에서만 다시 사용함
+    """
+    entry = manifestData.get(imgFilePath)
+    if entry is None or fileStamp is None or entry["stamp"] != fileStamp:
+        return None
+    modeLevel = CHECK_MODE_LIST.index(mode)
+    entryLevel = CHECK_MODE_LIST.index(entry["mode"])
+    if entry["isOk"] and entryLevel >= modeLevel:
+        return True, None, None
+    if not entry["isOk"] and entryLevel <= modeLevel:
+        return False, entry["errorType"], entry["errorMessage"]
+    return None
+
+def checkImageFiles(imgFilePathList, logFilePath=None, mode="header", workers=1, useProcess=False, manifestPath=None):
     """이미지 파일이 로드가 가능한 것인지 확인하는 메서드
     원리는 그냥 PIL로 메모리에 올려보면서 예최가 발생하는지 확인함
+    args
+        imgFilePathList : list of str
+        logFilePath : 에러 log 파일, None이면 콘솔
+        mode : "header", "verify", "decode"
+        workers : 동시에 확인할 개수
+        useProcess : True => process pool, False => thread pool
+        manifestPath : (경로, 크기, 수정시간)별 결과를 저장하는 json, 바뀌지 않은 파일은 다시 확인하지 않음
+    return
+        list of ImageCheckResult (imgFilePathList 순서)
     """
-    from PIL import Image
+    assert mode in CHECK_MODE_LIST and workers > 0
     # logging setting
     import logging
     logger = logging.getLogger(checkImageFiles.__name__)
@@ -92,20 +438,160 @@ def checkImageFiles(imgFilePathList, logFilePath=None):
             logStream = logging.StreamHandler()
             logStream.setFormatter(logFormat)
             logger.addHandler(logStream)
-    # start check image
-    tmpImg = None
+    # manifest에 없는 파일만 확인함
+    manifestData = _loadCheckManifest(manifestPath)
+    checkList = [None] * len(imgFilePathList)
+    stampList = [_getFileStamp(itPath) for itPath in imgFilePathList]
+    todoIndexList = []
     for itIndex, itPath in enumerate(imgFilePathList):
+        checkList[itIndex] = _getCachedCheck(manifestData, itPath, stampList[itIndex], mode)
+        if checkList[itIndex] is None:
+            todoIndexList.append(itIndex)
+    # start check image
+    todoPathList = [imgFilePathList[itIndex] for itIndex in todoIndexList]
+    if 1 == workers:
+        checkedList = [_checkImageFile(itPath, mode) for itPath in todoPathList]
+    else:
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        poolClass = ProcessPoolExecutor if useProcess else ThreadPoolExecutor
+        with poolClass(max_workers=workers) as executor:
+            chunkSize = max(1, len(todoPathList) // (workers * 4)) if useProcess else 1
+            checkedList = list(executor.map(_checkImageFile, todoPathList, [mode] * len(todoPathList), chunksize=chunkSize))
+    for itIndex, itChecked in zip(todoIndexList, checkedList):
+        checkList[itIndex] = itChecked
+        if stampList[itIndex] is not None:
+            isOk, errorType, errorMessage = itChecked
+            manifestData[imgFilePathList[itIndex]] = {"stamp": stampList[itIndex], "mode": mode, "isOk": isOk,
+                                                      "errorType": errorType, "errorMessage": errorMessage}
+    if manifestPath is not None and 0 < len(todoIndexList):
+        _saveCheckManifest(manifestPath, manifestData)
+    resultList = []
+    for itIndex, (itPath, (isOk, errorType, errorMessage)) in enumerate(zip(imgFilePathList, checkList)):
+        if not isOk:
+            logger.error("Error : [{}] : {} : {} : {}".format(itIndex, itPath, errorType, errorMessage))
+        resultList.append(ImageCheckResult(itIndex, itPath, isOk, errorType, errorMessage))
+    return resultList
+
+def _getThumbnailCachePath(cacheDir, imgFilePath, thumbSize):
+    """(경로, 크기, 수정시간, thumbSize)로 정해지는 thumbnail 파일 경로, 파일이 없으면 None
+    """
+    import hashlib
+    fileStamp = _getFileStamp(imgFilePath)
+    if cacheDir is None or fileStamp is None:
+        return None
+    cacheKey = json.dumps([os.path.abspath(imgFilePath), fileStamp, thumbSize])
+    return os.path.join(cacheDir, hashlib.sha1(cacheKey.encode("utf-8")).hexdigest() + ".png")
+
+def _toRgbUint8(img):
+    """imshow에 넣던 배열(gray, RGB, RGBA, float [0, 1])을 RGB uint8로 바꿈
+    """
+    img = np.asarray(img)
+    if np.uint8 != img.dtype:
+        img = np.clip(img * 255.0 if np.issubdtype(img.dtype, np.floating) else img, 0, 255).astype(np.uint8)
+    if 2 == img.ndim:
+        return np.repeat(img[..., None], 3, axis=2)
+    return img[..., :3]
+
+def _getThumbnail(item, thumbSize, cacheDir = None):
+    """item을 긴 변이 thumbSize가 되도록 줄인 RGB 이미지, 읽을 수 없으면 None
+    args
+        item : str (이미지 파일 경로) or np.ndarray (RGB)
+        thumbSize : int
+        cacheDir : thumbnail을 저장하는 폴더, None이면 저장하지 않음
+    """
+    import cv2
+    if not isinstance(item, str):
+        img = _toRgbUint8(item)
+    else:
+        cachePath = _getThumbnailCachePath(cacheDir, item, thumbSize)
+        if cachePath is not None and os.path.isfile(cachePath):
+            thumbImg = cv2.imread(cachePath, cv2.IMREAD_COLOR)
+            if thumbImg is not None:
+                return thumbImg[..., ::-1]
+        # JPEG는 draft로 thumbSize 이상인 가장 작은 크기로 decode 함
+        from PIL import Image
         try:
-            tmpImg = Image.open(itPath)
-        except Exception as ex:
-            print("Error : [{}] : {}".format(itIndex, itPath))
-            print("{} : {}".format(type(ex).__name__, ex.__str__()))
+            with Image.open(item) as tmpImg:
+                tmpImg.draft("RGB", (thumbSize, thumbSize))
+                img = np.asarray(tmpImg.convert("RGB"))
+        except Exception:
+            return None
+    rate = thumbSize / max(img.shape[:2])
+    if rate < 1:
+        img = cv2.resize(img, (max(1, round(img.shape[1] * rate)), max(1, round(img.shape[0] * rate))), interpolation=cv2.INTER_AREA)
+    if isinstance(item, str) and cachePath is not None:
+        os.makedirs(cacheDir, exist_ok=True)
+        tmpPath = os.path.join(cacheDir, "tmp_{}_{}".format(os.getpid(), os.path.basename(cachePath)))
+        cv2.imwrite(tmpPath, img[..., ::-1])
+        os.replace(tmpPath, cachePath)
+    return img
 
-def showImageFiles(imgPathList):
+def createContactSheet(imgList, thumbSize = 128, cols = None, cacheDir = None, workers = 4, isLabel = True, bgColor = (0, 0, 0)):
+    """여러 이미지를 thumbnail로 줄여 번호와 함께 한 장의 RGB 이미지에 바둑판으로 붙임
+    thumbnail은 thread pool에서 만들고 미리 만든 canvas의 칸에 바로 씀
+    args
+        imgList : list of (str or np.ndarray RGB)
+        thumbSize : 칸 한 변의 길이
+        cols : 가로 칸 수, None이면 정사각형에 가깝게 정함
+        cacheDir : 파일 경로의 thumbnail을 (경로, 수정시간)별로 저장하는 폴더
+        workers : thread 개수
+        isLabel : True이면 칸마다 번호를 씀, 읽지 못한 이미지는 칸에 X를 그림
+        bgColor : 빈 곳의 색 (R, G, B)
+    return
+        canvas : np.ndarray uint8 (rows * thumbSize, cols * thumbSize, 3)
+    """
+    import cv2
+    from concurrent.futures import ThreadPoolExecutor
+    count = len(imgList)
+    cols = max(1, int(np.ceil(np.sqrt(count)))) if cols is None else cols
+    rows = max(1, (count + cols - 1) // cols)
+    canvas = np.empty((rows * thumbSize, cols * thumbSize, 3), np.uint8)
+    canvas[:] = bgColor
+    fontScale = thumbSize / 256
+
+    def drawCell(itNum):
+        top, left = (itNum // cols) * thumbSize, (itNum % cols) * thumbSize
+        cellImg = canvas[top:top + thumbSize, left:left + thumbSize]
+        thumbImg = _getThumbnail(imgList[itNum], thumbSize, cacheDir)
+        if thumbImg is None:
+            cv2.line(cellImg, (0, 0), (thumbSize - 1, thumbSize - 1), (255, 0, 0), 2)
+            cv2.line(cellImg, (0, thumbSize - 1), (thumbSize - 1, 0), (255, 0, 0), 2)
+        else:
+            offsetY = (thumbSize - thumbImg.shape[0]) // 2
+            offsetX = (thumbSize - thumbImg.shape[1]) // 2
+            cellImg[offsetY:offsetY + thumbImg.shape[0], offsetX:offsetX + thumbImg.shape[1]] = thumbImg
+        if isLabel:
+            textPos = (2, max(10, int(20 * fontScale)))
+            cv2.putText(cellImg, str(itNum), textPos, cv2.FONT_HERSHEY_SIMPLEX, fontScale, (0, 0, 0), 3, cv2.LINE_AA)
+            cv2.putText(cellImg, str(itNum), textPos, cv2.FONT_HERSHEY_SIMPLEX, fontScale, (255, 255, 255), 1, cv2.LINE_AA)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(drawCell, range(count)))
+    return canvas
+
+def showImageFiles(imgPathList, isMontage = False, thumbSize = 128, cols = None, cacheDir = None, savePath = None, workers = 4):
     """본래 디버그 용도로 만듬
+    isMontage가 True이면 createContactSheet로 만든 한 장의 이미지만 그리므로 수백, 수천 장도 빠름
+    args
+        imgPathList : list of np.ndarray (RGB), isMontage이면 파일 경로도 가능
+        isMontage : True => contact sheet 한 장, False => 이미지마다 subplot
+        thumbSize, cols, cacheDir, workers : createContactSheet와 같음
+        savePath : isMontage일 때 화면 대신 파일로 저장함
     """
     # %matplotlib inlie
     import matplotlib.pyplot as plt
+    if isMontage:
+        canvas = createContactSheet(imgPathList, thumbSize, cols, cacheDir, workers)
+        if savePath is not None:
+            import cv2
+            cv2.imwrite(savePath, canvas[..., ::-1])
+            return canvas
+        fig = plt.figure(figsize=(canvas.shape[1] / 100, canvas.shape[0] / 100), dpi=100)
+        a = fig.add_axes([0, 0, 1, 1])
+        a.imshow(canvas, interpolation="nearest")
+        a.axis("off")
+        plt.show()
+        return canvas
     count = len(imgPathList)
     r, c, = 1, 1
     while r * c < count:
@@ -0,0 +1,88 @@
+import numpy as np
+
+__version__ = 0.1
+
+class NoiseAugmenter:
+    """uint8 이미지 batch에 노이즈를 in-place로 더하는 도구
+    float32 노이즈 버퍼를 미리 만들어 두고 재사용하며, 결과는 [0, 255]로 포화(saturate)시킴
+    figureTools.getFigureImageBatch 등이 만든 (N, H, W, 3) 배열에 바로 사용함
+    """
+    def __init__(self, batchShape, rng = None):
+        """
+        args
+            batchShape : tuple (N, H, W, C) 최대 batch 모양, 더 작은 N은 버퍼 앞부분만 사용함
+            rng : np.random.Generator or None
+        """
+        self.batchShape = tuple(batchShape)
+        self.rng = np.random.default_rng() if rng is None else rng
+        self._noiseBuffer = np.empty(self.batchShape, np.float32)
+
+    def _getBuffer(self, batch):
+        assert isinstance(batch, np.ndarray) and np.uint8 == batch.dtype
+        assert batch.shape[1:] == self.batchShape[1:] and batch.shape[0] <= self.batchShape[0]
+        return self._noiseBuffer[:batch.shape[0]]
+
+    def _getPerSample(self, value, batch):
+        """스칼라 혹은 sample별 값을 batch 모양에 맞게 broadcast 가능하게 만듬
+        """
+        value = np.asarray(value, np.float32)
+        if 0 == value.ndim:
+            return value
+        assert value.shape == (batch.shape[0],)
+        return value.reshape((-1,) + (1,) * (batch.ndim - 1))
+
+    def _storeSaturated(self, batch, noiseBuffer):
+        """float 버퍼를 [0, 255]로 자르고 반올림해서 batch에 씀
+        """
+        np.clip(noiseBuffer, 0, 255, out=noiseBuffer)
+        np.rint(noiseBuffer, out=noiseBuffer)
+        np.copyto(batch, noiseBuffer, casting="unsafe")
+        return batch
+
+    def addGaussNoise(self, batch, sigma):
+        """가우스 노이즈, 음의 노이즈도 0에서 포화됨
+        args
+            batch : np.ndarray uint8 (n, H, W, C), 결과가 여기에 써짐
+            sigma : float or np.ndarray (n,) 표준 편차
+        return
+            batch : np.ndarray
+        """
+        noiseBuffer = self._getBuffer(batch)
+        self.rng.standard_normal(out=noiseBuffer, dtype=np.float32)
+        noiseBuffer *= self._getPerSample(sigma, batch)
+        noiseBuffer += batch
+        return self._storeSaturated(batch, noiseBuffer)
+
+    def addSpeckleNoise(self, batch, sigma):
+        """곱셈 노이즈 img * (1 + n), n ~ N(0, sigma)
+        args
+            batch : np.ndarray uint8 (n, H, W, C), 결과가 여기에 써짐
+            sigma : float or np.ndarray (n,)
+        return
+            batch : np.ndarray
+        """
+        noiseBuffer = self._getBuffer(batch)
+        self.rng.standard_normal(out=noiseBuffer, dtype=np.float32)
+        noiseBuffer *= self._getPerSample(sigma, batch)
+        noiseBuffer += 1
+        noiseBuffer *= batch
+        return self._storeSaturated(batch, noiseBuffer)
+
+    def addSaltPepperNoise(self, batch, amount, saltRate = 0.5):
+        """salt and pepper 노이즈, 픽셀 단위로 모든 채널을 0 혹은 255로 바꿈
+        args
+            batch : np.ndarray uint8 (n, H, W, C), 결과가 여기에 써짐
+            amount : float or np.ndarray (n,) 바뀌는 픽셀 비율
+            saltRate : 바뀌는 픽셀 중 255가 되는 비율
+        return
+            batch : np.ndarray
+        """
+        # 버퍼 앞부분을 채널 하나 분량의 연속 배열로 사용함
+        self._getBuffer(batch)
+        pixelShape = batch.shape[:-1]
+        probBuffer = self._noiseBuffer.reshape(-1)[:int(np.prod(pixelShape))].reshape(pixelShape)
+        self.rng.random(out=probBuffer, dtype=np.float32)
+        amount = self._getPerSample(amount, batch[..., 0])
+        batch[probBuffer < amount * saltRate] = 255
+        batch[(probBuffer >= amount * saltRate) & (probBuffer < amount)] = 0
+        return batch
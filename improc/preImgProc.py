@@ -1,7 +1,10 @@
 import cv2
 import os
+import collections
+import functools
 import numpy as np
 import sys
+import threading
 sys.path.append(os.path.dirname(__file__))
 from imgProc import ColorPixelManager
 
@@ -19,6 +22,7 @@ def _getResizeFilter(isSrcImgGreater):
 
 def _getImgResizeOneLength(srcImg, wantSize, isRgb=True):
     """width, height 중 하나의 비율만 가지고 resize 해주는 hide 메서드
+    resize는 채널 순서와 상관없으므로 색 변환을 하지 않음
     args
         srcImg : np.ndarray
         wantSize = tuple(width, height) and ( (width, 0) or (0, height) )
@@ -29,7 +33,6 @@ def _getImgResizeOneLength(srcImg, wantSize, isRgb=True):
     dstImg = None
     if isinstance(srcImg, np.ndarray):
         srcHeight, srcWidth, _ = srcImg.shape
-        tmpImg = cv2.cvtColor(srcImg, cv2.COLOR_RGB2BGR) if isRgb else srcImg.copy()
         if isinstance(wantSize, tuple) and 2 == len(wantSize):
             wantWidth, wantHeight = wantSize
             # height 기준으로 크기 변경
@@ -37,191 +40,356 @@ def _getImgResizeOneLength(srcImg, wantSize, isRgb=True):
                 resizeFlag = _getResizeFilter(srcHeight > wantHeight)
                 dstWidth = (srcWidth * wantHeight) // srcHeight
                 dstSize = (dstWidth, wantHeight)
-                dstImg = cv2.resize(tmpImg, dsize=dstSize, interpolation=resizeFlag)
+                dstImg = cv2.resize(srcImg, dsize=dstSize, interpolation=resizeFlag)
             # width 기준으로 크기 변경
             elif 0 == wantHeight:
                 resizeFlag = _getResizeFilter(srcWidth > wantWidth)
                 dstHeight = (srcHeight * wantWidth) // srcWidth
                 dstSize = (wantWidth, dstHeight)
-                dstImg = cv2.resize(tmpImg, dsize=dstSize, interpolation=resizeFlag)
-    return cv2.cvtColor(dstImg, cv2.COLOR_BGR2RGB) if isRgb else dstImg
+                dstImg = cv2.resize(srcImg, dsize=dstSize, interpolation=resizeFlag)
+    return dstImg
+
+# letterbox resize 방법, 원본 크기와 원하는 크기만으로 정해짐
+#   dstWidth, dstHeight : 원본을 줄이거나 늘린 크기
+#   top, bottom, left, right : padding 크기, 홀수일 때는 위쪽 / 왼쪽이 1 pixel 더 큼
+#   interpolation : cv2 resize flag
+ResizePlan = collections.namedtuple("ResizePlan", ["dstWidth", "dstHeight", "top", "bottom", "left", "right", "interpolation"])
+
+@functools.lru_cache(maxsize=256)
+def _getResizePlan(srcHeight, srcWidth, wantWidth, wantHeight):
+    """비율을 유지하면서 (wantWidth, wantHeight)에 맞추는 ResizePlan
+    dataset의 원본 크기 종류는 많지 않으므로 크기별로 cache 함
+    """
+    if srcWidth > srcHeight:
+        tmpHeight = (srcHeight * wantWidth) // srcWidth
+        # height에 padding이 필요한 경우
+        isHeightPadding = tmpHeight < wantHeight
+    else:
+        tmpWidth = (srcWidth * wantHeight) // srcHeight
+        # height에 padding이 필요한 경우
+        isHeightPadding = tmpWidth > wantWidth
+    if isHeightPadding:
+        dstHeight = max(1, (srcHeight * wantWidth) // srcWidth)
+        deltaHeight = wantHeight - dstHeight
+        return ResizePlan(wantWidth, dstHeight, deltaHeight - deltaHeight // 2, deltaHeight // 2, 0, 0,
+                          _getResizeFilter(srcWidth > wantWidth))
+    dstWidth = max(1, (srcWidth * wantHeight) // srcHeight)
+    deltaWidth = wantWidth - dstWidth
+    return ResizePlan(dstWidth, wantHeight, 0, 0, deltaWidth - deltaWidth // 2, deltaWidth // 2,
+                      _getResizeFilter(srcHeight > wantHeight))
+
+def _getBorderColor(borderImg):
+    """테두리 한 줄에서 가장 많은 색
+    """
+    _, maxColorStr = ColorPixelManager(borderImg).getMinMaxPixel()
+    return [int(it) for it in maxColorStr.split(",")]
+
+def _letterboxInto(srcImg, plan, dstImg):
+    """plan대로 srcImg를 dstImg 안의 자리에 바로 resize하고 나머지를 테두리 색으로 채움
+    args
+        srcImg : np.ndarray (rows, cols, channels)
+        plan : ResizePlan
+        dstImg : np.ndarray (wantHeight, wantWidth, channels)
+    """
+    roiImg = dstImg[plan.top:plan.top + plan.dstHeight, plan.left:plan.left + plan.dstWidth]
+    resizedImg = cv2.resize(srcImg, (plan.dstWidth, plan.dstHeight), dst=roiImg, interpolation=plan.interpolation)
+    if not np.shares_memory(resizedImg, roiImg):
+        roiImg[...] = resizedImg
+    return _fillLetterboxPadding(plan, dstImg)
+
+def _fillLetterboxPadding(plan, dstImg):
+    """plan의 resize 영역은 이미 채워져 있고 padding 영역만 테두리 색으로 채움
+    """
+    roiImg = dstImg[plan.top:plan.top + plan.dstHeight, plan.left:plan.left + plan.dstWidth]
+    if 0 < plan.top:
+        dstImg[:plan.top] = _getBorderColor(roiImg[:1])
+    if 0 < plan.bottom:
+        dstImg[plan.top + plan.dstHeight:] = _getBorderColor(roiImg[-1:])
+    if 0 < plan.left:
+        dstImg[:, :plan.left] = _getBorderColor(roiImg[:, :1])
+    if 0 < plan.right:
+        dstImg[:, plan.left + plan.dstWidth:] = _getBorderColor(roiImg[:, -1:])
+    return dstImg
 
 def maintainRateResize(srcImg, wantSize = (300, 300), isRgb = True):
     """이미지의 비율을 유지한 크기변경
+    원본의 화면비율과 상관없이 변경하는 경우 padding을 하여 원하는 이미지 크기와 비율을 맞춰줌
+    padding 색은 padding이 붙는 테두리 한 줄에서 가장 많은 색
     args
         srcImg : np.ndarray
         wantSize : tuple(width, height)
+        isRgb : 채널 순서, resize와 padding은 채널 순서와 상관없음
     return
         dstImg : np.ndarray
     """
     dstImg = None
-    if isinstance(srcImg, np.ndarray):
-        srcHeight, srcWidth, _ = srcImg.shape
-        if isinstance(wantSize, tuple):
-            wantWidth, wantHeight = wantSize
-            # 특정 길이를 기준으로 특정 길이를 늘이려고 할 경우
-            if 0 == wantWidth or 0 == wantHeight:
-                dstImg = _getImgResizeOneLength(srcImg, wantSize, isRgb)
-            # 원본의 화면비율과 상관없이 변경하는 경우
-            # padding을 하여 원하는 이미지 크기와 비율을 맞춰줌
-            else:
-                if srcWidth > srcHeight:
-                    tmpHeight = (srcHeight * wantWidth) // srcWidth
-                    # height에 padding이 필요로 하는 경우
-                    if tmpHeight < wantHeight:
-                        deltaHeight = wantHeight - tmpHeight
-                        halfDeltaHeight = deltaHeight // 2
-                        # rgb와 bgr 순서를 자주 바꾸지 않도록 하기 위해 RGB인 경우 BGR로 미리 바꿈
-                        workImg = cv2.cvtColor(srcImg, cv2.COLOR_RGB2BGR) if isRgb else srcImg.copy()
-                        tmpImg = _getImgResizeOneLength(workImg, (wantWidth, 0), False)
-                        # 홀수일 경우 윗쪽에 1 pixel 더 padding 함
-                        oddHeight = 1 if 1 == deltaHeight % 2 else 0
-                        # dstImg = cv2.copyMakeBorder(tmpImg, halfDeltaHeight + oddHeight, halfDeltaHeight, 0, 0, cv2.BORDER_REPLICATE)
-                        bordertmpImg = tmpImg[:1, :]
-                        tmpColorPixel = ColorPixelManager(bordertmpImg)
-                        _, maxColorStr = tmpColorPixel.getMinMaxPixel()
-                        maxColor = [int(it) for it in maxColorStr.split(",")]
-                        dstImg = cv2.copyMakeBorder(tmpImg, halfDeltaHeight + oddHeight, 0, 0, 0, cv2.BORDER_CONSTANT, value=maxColor)
-                        tmpImgRows = tmpImg.shape[0]
-                        bordertmpImg = tmpImg[tmpImgRows-1:tmpImgRows, :]
-                        tmpColorPixel = ColorPixelManager(bordertmpImg)
-                        _, maxColorStr = tmpColorPixel.getMinMaxPixel()
-                        maxColor = [int(it) for it in maxColorStr.split(",")]
-                        dstImg = cv2.copyMakeBorder(dstImg, 0, halfDeltaHeight, 0, 0, cv2.BORDER_CONSTANT, value=maxColor)
-                        dstImg = cv2.cvtColor(dstImg, cv2.COLOR_BGR2RGB) if isRgb else dstImg
-                    # width에 padding이 필요한 경우
-                    elif tmpHeight > wantHeight:
-                        tmpWidth = (srcWidth * wantHeight) // srcHeight
-                        deltaWidth = wantWidth - tmpWidth
-                        halfDeltaWidth = deltaWidth // 2
-                        # rgb와 bgr 순서를 자주 바꾸지 않도록 하기 위해 RGB인 경우 BGR로 미리 바꿈
-                        workImg = cv2.cvtColor(srcImg, cv2.COLOR_RGB2BGR) if isRgb else srcImg.copy()
-                        tmpImg = _getImgResizeOneLength(workImg, (0, wantHeight), False)
-                        # 홀수일 경우 왼쪽에 1 pixel 더 padding 함
-                        oddWidth = 1 if 1 == deltaWidth % 2 else 0
-                        # dstImg = cv2.copyMakeBorder(tmpImg, 0, 0, halfDeltaWidth + oddWidth, halfDeltaWidth, cv2.BORDER_REPLICATE)
-                        bordertmpImg = tmpImg[:, :1]
-                        tmpColorPixel = ColorPixelManager(bordertmpImg)
-                        _, maxColorStr = tmpColorPixel.getMinMaxPixel()
-                        maxColor = [int(it) for it in maxColorStr.split(",")]
-                        dstImg = cv2.copyMakeBorder(tmpImg, 0, 0, halfDeltaWidth + oddWidth, 0, cv2.BORDER_CONSTANT, value=maxColor)
-                        tmpImgCols = tmpImg.shape[1]
-                        bordertmpImg = tmpImg[:, tmpImgCols-1:tmpImgCols]
-                        tmpColorPixel = ColorPixelManager(bordertmpImg)
-                        _, maxColorStr = tmpColorPixel.getMinMaxPixel()
-                        maxColor = [int(it) for it in maxColorStr.split(",")]
-                        dstImg = cv2.copyMakeBorder(dstImg, 0, 0, 0, halfDeltaWidth, cv2.BORDER_CONSTANT, value=maxColor)
-                        dstImg = cv2.cvtColor(dstImg, cv2.COLOR_BGR2RGB) if isRgb else dstImg
-                    # padding이 필요 없는 경우
-                    else:
-                        dstImg = _getImgResizeOneLength(srcImg, (wantHeight, 0), isRgb)
-                # 원본의 height가 더 큰 경우 혹은 같은 경우
-                else:
-                    tmpWidth = (srcWidth * wantHeight) // srcHeight
-                    # width에 padding이 필요한 경우
-                    if tmpWidth < wantWidth:
-                        deltaWidth = wantWidth - tmpWidth
-                        halfDeltaWidth = deltaWidth // 2
-                        # rgb와 bgr 순서를 자주 바꾸지 않도록 하기 위해 RGB인 경우 BGR로 미리 바꿈
-                        workImg = cv2.cvtColor(srcImg, cv2.COLOR_RGB2BGR) if isRgb else srcImg.copy()
-                        tmpImg = _getImgResizeOneLength(workImg, (0, wantHeight), False)
-                        # 홀수일 경우 왼쪽에 1 pixel 더 padding 함
-                        oddWidth = 1 if 1 == deltaWidth % 2 else 0
-                        # dstImg = cv2.copyMakeBorder(tmpImg, 0, 0, halfDeltaWidth + oddWidth, halfDeltaWidth, cv2.BORDER_REPLICATE)
-                        bordertmpImg = tmpImg[:1, :]
-                        tmpColorPixel = ColorPixelManager(bordertmpImg)
-                        _, maxColorStr = tmpColorPixel.getMinMaxPixel()
-                        maxColor = [int(it) for it in maxColorStr.split(",")]
-                        dstImg = cv2.copyMakeBorder(tmpImg, halfDeltaHeight + oddHeight, 0, 0, 0, cv2.BORDER_CONSTANT, value=maxColor)
-                        tmpImgRows = tmpImg.shape[0]
-                        bordertmpImg = tmpImg[tmpImgRows-1:tmpImgRows, :]
-                        tmpColorPixel = ColorPixelManager(bordertmpImg)
-                        _, maxColorStr = tmpColorPixel.getMinMaxPixel()
-                        maxColor = [int(it) for it in maxColorStr.split(",")]
-                        dstImg = cv2.copyMakeBorder(dstImg, 0, halfDeltaHeight, 0, 0, cv2.BORDER_CONSTANT, value=maxColor)
-                        dstImg = cv2.cvtColor(dstImg, cv2.COLOR_BGR2RGB) if isRgb else dstImg
-                    # height에 padding이 필요한 경우
-                    elif tmpWidth > wantWidth:
-                        tmpHeight = (srcHeight * wantWidth) // srcWidth
-                        deltaHeight = wantHeight - tmpHeight
-                        halfDeltaHeight = deltaHeight // 2
-                        # rgb와 bgr 순서를 자주 바꾸지 않도록 하기 위해 RGB인 경우 BGR로 미리 바꿈
-                        workImg = cv2.cvtColor(srcImg, cv2.COLOR_RGB2BGR) if isRgb else srcImg.copy()
-                        tmpImg = _getImgResizeOneLength(workImg, (wantWidth, 0), False)
-                        # 홀수일 경우 윗쪽에 1 pixel 더 padding 함
-                        oddHeight = 1 if 1 == deltaHeight % 2 else 0
-                        # dstImg = cv2.copyMakeBorder(tmpImg, halfDeltaHeight + oddHeight, halfDeltaHeight, 0, 0, cv2.BORDER_REPLICATE)
-                        bordertmpImg = tmpImg[:, :1]
-                        tmpColorPixel = ColorPixelManager(bordertmpImg)
-                        _, maxColorStr = tmpColorPixel.getMinMaxPixel()
-                        maxColor = [int(it) for it in maxColorStr.split(",")]
-                        dstImg = cv2.copyMakeBorder(tmpImg, 0, 0, halfDeltaWidth + oddWidth, 0, cv2.BORDER_CONSTANT, value=maxColor)
-                        tmpImgCols = tmpImg.shape[1]
-                        bordertmpImg = tmpImg[:, tmpImgCols-1:tmpImgCols]
-                        tmpColorPixel = ColorPixelManager(bordertmpImg)
-                        _, maxColorStr = tmpColorPixel.getMinMaxPixel()
-                        maxColor = [int(it) for it in maxColorStr.split(",")]
-                        dstImg = cv2.copyMakeBorder(dstImg, 0, 0, 0, halfDeltaWidth, cv2.BORDER_CONSTANT, value=maxColor)
-                        dstImg = cv2.cvtColor(dstImg, cv2.COLOR_BGR2RGB) if isRgb else dstImg
-                    # padding이 필요 없는 경우
-                    else:
-                        dstImg = _getImgResizeOneLength(srcImg, (0, wantHeight), isRgb)
+    if isinstance(srcImg, np.ndarray) and isinstance(wantSize, tuple):
+        srcHeight, srcWidth, channels = srcImg.shape
+        wantWidth, wantHeight = wantSize
+        # 특정 길이를 기준으로 특정 길이를 늘이려고 할 경우
+        if 0 == wantWidth or 0 == wantHeight:
+            dstImg = _getImgResizeOneLength(srcImg, wantSize, isRgb)
+        else:
+            plan = _getResizePlan(srcHeight, srcWidth, wantWidth, wantHeight)
+            dstImg = _letterboxInto(srcImg, plan, np.empty((wantHeight, wantWidth, channels), srcImg.dtype))
     return dstImg
 
+def maintainRateResizeBatch(srcImgList, wantSize = (300, 300), out = None):
+    """여러 이미지를 maintainRateResize 해서 (N, height, width, channels) 배열 하나에 바로 씀
+    원본 크기별 ResizePlan은 cache 되고 중간 이미지나 색 변환이 없음
+    args
+        srcImgList : list of np.ndarray (rows, cols, channels), 크기는 달라도 됨
+        wantSize : tuple(width, height)
+        out : np.ndarray (N, height, width, channels) or None
+    return
+        out : np.ndarray
+    """
+    wantWidth, wantHeight = wantSize
+    assert 0 < wantWidth and 0 < wantHeight and 0 < len(srcImgList)
+    if out is None:
+        out = np.empty((len(srcImgList), wantHeight, wantWidth, srcImgList[0].shape[2]), srcImgList[0].dtype)
+    assert out.shape[:3] == (len(srcImgList), wantHeight, wantWidth)
+    for itNum, itImg in enumerate(srcImgList):
+        srcHeight, srcWidth = itImg.shape[:2]
+        _letterboxInto(itImg, _getResizePlan(srcHeight, srcWidth, wantWidth, wantHeight), out[itNum])
+    return out
+
+class LetterboxTensorizer:
+    """여러 이미지를 letterbox resize 해서 정규화한 float32 batch tensor에 바로 씀
+    이미지마다 uint8 작업 버퍼 하나에 resize와 padding을 하고
+    채널별 cv2.LUT float32 표 ((v / 255 - mean) / std)로 dtype 변환, 정규화, 채널 순서 변경을
+    tensor의 NCHW plane 혹은 NHWC 자리에 한번에 씀, 작업 버퍼는 재사용하므로 이미지별 할당이 없음
+    """
+    def __init__(self, wantSize = (300, 300), mean = (0., 0., 0.), std = (1., 1., 1.), isSrcRgb = True, isDstRgb = True, layout = "NCHW"):
+        """
+        args
+            wantSize : tuple(width, height)
+            mean, std : 결과 채널 순서의 [0, 1] 기준 평균과 표준 편차
+            isSrcRgb : 입력 이미지 채널 순서, True => RGB, False => BGR
+            isDstRgb : tensor 채널 순서
+            layout : "NCHW" or "NHWC"
+        """
+        assert layout in ("NCHW", "NHWC")
+        self.wantWidth, self.wantHeight = wantSize
+        assert 0 < self.wantWidth and 0 < self.wantHeight
+        self.layout = layout
+        # 결과 채널 c는 입력 채널 srcChannels[c]에서 옴
+        self.srcChannels = [0, 1, 2] if isSrcRgb == isDstRgb else [2, 1, 0]
+        values = np.arange(256, dtype=np.float64) / 255
+        self.lutList = [((values - mean[itCh]) / std[itCh]).astype(np.float32).reshape(1, 256) for itCh in range(3)]
+        self._lut3 = np.ascontiguousarray(np.stack(self.lutList, axis=-1))
+        self._workImg = np.empty((self.wantHeight, self.wantWidth, 3), np.uint8)
+        self._orderImg = np.empty_like(self._workImg)
+        self._planeImg = np.empty((self.wantHeight, self.wantWidth), np.uint8)
+
+    def getTensorShape(self, count):
+        if "NCHW" == self.layout:
+            return (count, 3, self.wantHeight, self.wantWidth)
+        return (count, self.wantHeight, self.wantWidth, 3)
+
+    def _writeLut(self, srcImg, lut, dstImg):
+        resultImg = cv2.LUT(srcImg, lut, dst=dstImg)
+        if not np.shares_memory(resultImg, dstImg):
+            dstImg[...] = resultImg.reshape(dstImg.shape)
+
+    def _writeTensor(self, dstTensor):
+        """작업 버퍼를 정규화해서 tensor 한 칸에 씀
+        """
+        if "NCHW" == self.layout:
+            for itCh, itSrcCh in enumerate(self.srcChannels):
+                cv2.extractChannel(self._workImg, itSrcCh, dst=self._planeImg)
+                self._writeLut(self._planeImg, self.lutList[itCh], dstTensor[itCh])
+        else:
+            srcImg = self._workImg
+            if [0, 1, 2] != self.srcChannels:
+                cv2.mixChannels([self._workImg], [self._orderImg], [0, 2, 1, 1, 2, 0])
+                srcImg = self._orderImg
+            self._writeLut(srcImg, self._lut3, dstTensor)
+
+    def __call__(self, srcImgList, out = None):
+        """
+        args
+            srcImgList : list of np.ndarray uint8 (rows, cols, 3), 크기는 달라도 됨
+            out : np.ndarray float32 getTensorShape(len(srcImgList)) or None
+        return
+            out : np.ndarray float32
+        """
+        if out is None:
+            out = np.empty(self.getTensorShape(len(srcImgList)), np.float32)
+        assert out.shape == self.getTensorShape(len(srcImgList)) and np.float32 == out.dtype
+        for itNum, itImg in enumerate(srcImgList):
+            assert np.uint8 == itImg.dtype and 3 == itImg.shape[2]
+            plan = _getResizePlan(itImg.shape[0], itImg.shape[1], self.wantWidth, self.wantHeight)
+            _letterboxInto(itImg, plan, self._workImg)
+            self._writeTensor(out[itNum])
+        return out
+
+# JPEG DCT 단계에서 1/factor로 줄여서 읽는 flag, 큰 factor부터
+_REDUCED_READ_FLAG_LIST = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+def _getResizedSize(srcHeight, srcWidth, wantSize):
+    """maintainRateResize에서 원본이 줄거나 늘어난 크기 (width, height)
+    """
+    wantWidth, wantHeight = wantSize
+    if 0 == wantWidth:
+        return (srcWidth * wantHeight) // srcHeight, wantHeight
+    if 0 == wantHeight:
+        return wantWidth, (srcHeight * wantWidth) // srcWidth
+    plan = _getResizePlan(srcHeight, srcWidth, wantWidth, wantHeight)
+    return plan.dstWidth, plan.dstHeight
+
+def _getReducedReadFlag(imgFilePath, wantSize):
+    """header만 읽어서 결과 크기 이상을 유지하는 가장 작은 JPEG 축소 decode flag를 고름
+    JPEG가 아니거나 줄일 수 없으면 cv2.IMREAD_COLOR
+    """
+    from PIL import Image
+    try:
+        with Image.open(imgFilePath) as tmpImg:
+            if "JPEG" != tmpImg.format:
+                return cv2.IMREAD_COLOR
+            srcWidth, srcHeight = tmpImg.size
+            # EXIF 회전(5 ~ 8)은 imread가 적용하므로 가로세로를 바꿈
+            if tmpImg.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+                srcWidth, srcHeight = srcHeight, srcWidth
+    except Exception:
+        return cv2.IMREAD_COLOR
+    dstWidth, dstHeight = _getResizedSize(srcHeight, srcWidth, wantSize)
+    for itFactor, itFlag in _REDUCED_READ_FLAG_LIST:
+        # libjpeg의 축소 크기는 올림
+        if -(-srcWidth // itFactor) >= dstWidth and -(-srcHeight // itFactor) >= dstHeight:
+            return itFlag
+    return cv2.IMREAD_COLOR
+
+def maintainRateResizeFile(imgFilePath, wantSize = (300, 300), isRgb = True):
+    """이미지 파일을 읽어서 maintainRateResize 함
+    크게 줄이는 JPEG는 결과 크기 이상이 되는 한 가장 작게(1/2, 1/4, 1/8) decode 한 뒤 정확한 크기로 resize 하므로
+    전체 크기 decode보다 빠르고 메모리를 적게 씀
+    args
+        imgFilePath : str
+        wantSize : tuple(width, height), maintainRateResize와 같음
+        isRgb : True => RGB 결과, False => BGR 결과
+    return
+        dstImg : np.ndarray or None (읽을 수 없는 경우)
+    """
+    srcImg = cv2.imread(imgFilePath, _getReducedReadFlag(imgFilePath, wantSize))
+    if srcImg is None:
+        return None
+    dstImg = maintainRateResize(srcImg, wantSize, False)
+    return cv2.cvtColor(dstImg, cv2.COLOR_BGR2RGB) if isRgb else dstImg
+
+def _getNoCropRotateMatrix(srcHeight, srcWidth, rotatedAngle):
+    """회전된 이미지가 원본 크기 안에 모두 들어가도록 줄이면서 중심으로 회전하는 2x3 affine 행렬
+    회전된 (W, H) 사각형의 외접 사각형은 (W|cos| + H|sin|, W|sin| + H|cos|) 이므로
+    scale = min(W / (W|cos| + H|sin|), H / (W|sin| + H|cos|)) 이고 모든 각도에서 정확함
+    """
+    rotatedRadians = np.radians(rotatedAngle)
+    absCos, absSin = abs(np.cos(rotatedRadians)), abs(np.sin(rotatedRadians))
+    scale = min(srcWidth / (srcWidth * absCos + srcHeight * absSin),
+                srcHeight / (srcWidth * absSin + srcHeight * absCos))
+    center = ((srcWidth - 1) / 2, (srcHeight - 1) / 2)
+    return cv2.getRotationMatrix2D(center, rotatedAngle, scale)
+
 def noCropRotateImg(srcImg, rotatedAngle):
-    """삭제되는 영역 없이 회전시킴 현재는 예각만 제대로 유호하다.
-    45도를 넘어가고 가로세로 비율이 1:1이 아니면 문제가 발생할 수 있다.
+    """삭제되는 영역 없이 회전시킴, 모든 각도와 가로세로 비율에서 동작함
+    줄이기, 회전, 이동을 affine 행렬 하나로 합쳐서 warpAffine 한번으로 처리함
+    빈 곳은 테두리 픽셀을 늘려서 채움 (BORDER_REPLICATE)
     args
         srcImg : np.ndarray
-        rotatedAngle : number
+        rotatedAngle : number (degree, 반시계 방향)
+    return
+        dstImg : np.ndarray 원본과 같은 크기
+    """
+    srcHeight, srcWidth = srcImg.shape[:2]
+    rotMatrix = _getNoCropRotateMatrix(srcHeight, srcWidth, rotatedAngle)
+    return cv2.warpAffine(srcImg, rotMatrix, (srcWidth, srcHeight), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+
+# _getNoCropRotateMaps cache가 쓰는 최대 byte, 항목 하나는 결과 높이 * 너비 * 6 byte
+# ex) 300x300 => 0.5MB, 1920x1080 => 11.9MB
+NO_CROP_ROTATE_MAP_CACHE_BYTES = 64 * 1024 * 1024
+_noCropRotateMapCache = collections.OrderedDict()
+_noCropRotateMapCacheLock = threading.Lock()
+
+def _makeNoCropRotateMaps(srcHeight, srcWidth, rotatedAngle, dstHeight, dstWidth):
+    """noCropRotateImg의 변환을 cv2.remap용 고정 소수점 좌표 map (CV_16SC2, CV_16UC1)으로 만듬
+    결과 크기가 원본과 다르면 회전한 결과를 결과 크기로 늘이거나 줄임
+    """
+    rotMatrix = _getNoCropRotateMatrix(srcHeight, srcWidth, rotatedAngle)
+    # pixel 중심 좌표 기준으로 원본 크기 => 결과 크기
+    scaleX, scaleY = dstWidth / srcWidth, dstHeight / srcHeight
+    scaleMatrix = np.array([[scaleX, 0, (scaleX - 1) / 2], [0, scaleY, (scaleY - 1) / 2], [0, 0, 1]])
+    invMatrix = cv2.invertAffineTransform(scaleMatrix[:2] @ np.vstack([rotMatrix, [0, 0, 1]]))
+    dstX, dstY = np.meshgrid(np.arange(dstWidth, dtype=np.float32), np.arange(dstHeight, dtype=np.float32))
+    mapX = (invMatrix[0, 0] * dstX + invMatrix[0, 1] * dstY + invMatrix[0, 2]).astype(np.float32)
+    mapY = (invMatrix[1, 0] * dstX + invMatrix[1, 1] * dstY + invMatrix[1, 2]).astype(np.float32)
+    fixedMap, interMap = cv2.convertMaps(mapX, mapY, cv2.CV_16SC2)
+    fixedMap.flags.writeable = False
+    interMap.flags.writeable = False
+    return fixedMap, interMap
+
+def _getNoCropRotateMaps(srcHeight, srcWidth, rotatedAngle, dstHeight, dstWidth):
+    """(원본 크기, 각도, 결과 크기)별로 cache 된 _makeNoCropRotateMaps 결과
+    cache 전체 크기가 NO_CROP_ROTATE_MAP_CACHE_BYTES를 넘으면 오래 쓰지 않은 것부터 버림
+    공유하는 배열이므로 쓰기 금지로 둠
+    """
+    mapKey = (srcHeight, srcWidth, rotatedAngle, dstHeight, dstWidth)
+    with _noCropRotateMapCacheLock:
+        if mapKey in _noCropRotateMapCache:
+            _noCropRotateMapCache.move_to_end(mapKey)
+            return _noCropRotateMapCache[mapKey]
+    maps = _makeNoCropRotateMaps(*mapKey)
+    with _noCropRotateMapCacheLock:
+        _noCropRotateMapCache[mapKey] = maps
+        _noCropRotateMapCache.move_to_end(mapKey)
+        cacheBytes = sum(itFixedMap.nbytes + itInterMap.nbytes for itFixedMap, itInterMap in _noCropRotateMapCache.values())
+        # 방금 넣은 항목은 한도보다 커도 남겨 둠
+        while cacheBytes > NO_CROP_ROTATE_MAP_CACHE_BYTES and 1 < len(_noCropRotateMapCache):
+            itFixedMap, itInterMap = _noCropRotateMapCache.popitem(last=False)[1]
+            cacheBytes -= itFixedMap.nbytes + itInterMap.nbytes
+    return maps
+
+def noCropRotateBatch(srcImgList, rotatedAngleList, dstSize = None, out = None, workers = 4):
+    """여러 이미지를 noCropRotateImg 처럼 회전시킴
+    각도 종류가 적은 augmentation 용도로 remap 좌표 map을 각도별로 한번만 만들어 두고
+    thread pool에서 cv2.remap으로 결과 배열에 바로 씀
+    map은 고정 소수점 좌표라서 고주파 영역에서는 noCropRotateImg와 최대 6 정도 밝기 차이가 날 수 있음
+    map cache 크기는 NO_CROP_ROTATE_MAP_CACHE_BYTES로 조절함
+    args
+        srcImgList : list of np.ndarray or np.ndarray (N, rows, cols, channels)
+        rotatedAngleList : sequence of number, 이미지별 각도
+        dstSize : tuple(width, height) or None, None이면 첫 이미지 크기
+        out : np.ndarray (N, height, width, channels) or None
+        workers : thread 개수
     return
-        cropImg : np.ndarray not has hall
+        out : np.ndarray
     """
-    # assert 90. > rotatedAngle and 0. <= rotatedAngle
-    halfPiCount = rotatedAngle // 90
-    print("Angles:", rotatedAngle)
-    tmpImg = srcImg.copy()
-    imgFrameSize = tmpImg.shape[:2]
-    rotatedRadians = np.radians(rotatedAngle -45)
-    # 잘리지 않을 만한 크기 계산
-    srcHeight, srcWidth = imgFrameSize
-    centerY, centerX = srcHeight // 2, srcWidth // 2
-    print("src center", centerX, centerY)
-    maxRadius = np.sqrt(centerX**2 + centerY**2)
-    boundaryOnY = centerX * np.tan(rotatedRadians)
-    minRadius = np.sqrt(centerX**2 + boundaryOnY**2)
-    smallWidth = int(round(srcWidth * minRadius / maxRadius))
-    smallHeight = int(round(srcHeight * minRadius / maxRadius))
-    # smallSize = (smallHeight, smallWidth)
-    # print(maxRadius, minRadius)
-    smallImg = _getImgResizeOneLength(tmpImg, (smallWidth, 0))
-    print("small image size:", smallImg.shape)
-    deltaWidth = srcWidth - smallWidth
-    deltaHeight = srcHeight - smallHeight
-    halfDeltaWidth = deltaWidth // 2
-    halfDeltaHeight = deltaHeight // 2
-    # padding 용 아직은 예각만 해당됨
-    # 귀찮아서 상수를 더했는데, 수학적으로는 맞지 않음
-    paddingModfiyConst = 10
-    betaWidthRadians = np.arcsin(srcHeight / (2 * maxRadius))
-    halfBigDeltaWidth = abs(int(round(maxRadius * np.cos(betaWidthRadians - rotatedRadians)))) + paddingModfiyConst
-    betaHeightRadians = np.arcsin(srcWidth / (2 * maxRadius))
-    halfBigDeltaHeight = abs(int(round(maxRadius * np.cos(betaHeightRadians - rotatedRadians)))) + paddingModfiyConst
-    # bigImg = cv2.copyMakeBorder(smallImg, halfDeltaHeight, halfDeltaHeight, halfDeltaWidth, halfDeltaWidth, cv2.BORDER_REPLICATE)
-    bigImg = cv2.copyMakeBorder(smallImg, halfBigDeltaHeight, halfBigDeltaHeight, halfBigDeltaWidth, halfBigDeltaWidth, cv2.BORDER_REPLICATE)
-    print("big iamge size:", bigImg.shape)
-    bigImgHeight, bigImgWidth = bigImg.shape[:2]
-    bigCenterY, bigCenterX = bigImgHeight // 2, bigImgWidth // 2
-    rotMatrix = cv2.getRotationMatrix2D((bigCenterX, bigCenterY), rotatedAngle, 1)
-    rotatedImg = cv2.warpAffine(bigImg, rotMatrix, (bigImgWidth, bigImgHeight))
-    # 자르기
-    deltaCropY = (bigImgHeight - srcHeight) // 2
-    deltaCropX = (bigImgWidth - srcWidth) // 2
-    cropImg = rotatedImg[deltaCropY : bigImgHeight - deltaCropY, deltaCropX : bigImgWidth - deltaCropX]
-    print("crop iamge size:", cropImg.shape)
-    # return rotatedImg
-    return cropImg
+    from concurrent.futures import ThreadPoolExecutor
+    assert len(srcImgList) == len(rotatedAngleList) and 0 < len(srcImgList)
+    firstImg = srcImgList[0]
+    dstWidth, dstHeight = (firstImg.shape[1], firstImg.shape[0]) if dstSize is None else dstSize
+    if out is None:
+        out = np.empty((len(srcImgList), dstHeight, dstWidth) + firstImg.shape[2:], firstImg.dtype)
+    assert out.shape[:3] == (len(srcImgList), dstHeight, dstWidth)
+
+    def rotateOne(itNum):
+        srcImg = srcImgList[itNum]
+        fixedMap, interMap = _getNoCropRotateMaps(srcImg.shape[0], srcImg.shape[1], float(rotatedAngleList[itNum]), dstHeight, dstWidth)
+        dstImg = cv2.remap(srcImg, fixedMap, interMap, cv2.INTER_LINEAR, dst=out[itNum], borderMode=cv2.BORDER_REPLICATE)
+        if not np.shares_memory(dstImg, out[itNum]):
+            out[itNum] = dstImg
 
+    if 1 == workers:
+        for itNum in range(len(srcImgList)):
+            rotateOne(itNum)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(rotateOne, range(len(srcImgList))))
+    return out
 
 if __name__ == "__main__":
     # os.chdir("./sampleData")
@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import hashlib
+import cv2
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.dirname(__file__))
+import preImgProc
+from imgProc import _getFileStamp
+
+__version__ = 0.1
+
+# 폴더 단위 전처리, 읽기 => maintainRateResize => (noCropRotateImg) => 저장
+# manifest에 파일별 (크기, 수정시간, 설정 hash)를 저장해 두고 다시 실행하면 바뀐 파일만 처리함
+
+IMG_EXT_LIST = [".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"]
+MANIFEST_FILE_NAME = "preprocManifest.json"
+
+def listImageFiles(srcDir):
+    """srcDir 아래의 이미지 파일 상대 경로 (정렬됨)
+    """
+    relPathList = []
+    for itRoot, _, itFileNames in os.walk(srcDir):
+        for itFileName in itFileNames:
+            if os.path.splitext(itFileName)[1].lower() in IMG_EXT_LIST:
+                relPathList.append(os.path.relpath(os.path.join(itRoot, itFileName), srcDir))
+    return sorted(relPathList)
+
+def getParamsHash(params):
+    """설정이 바뀌면 모든 파일을 다시 처리하도록 설정 dict의 hash를 만듬
+    """
+    paramsKey = json.dumps([params, preImgProc.__version__, __version__], sort_keys=True)
+    return hashlib.sha1(paramsKey.encode("utf-8")).hexdigest()
+
+def _processImageFile(srcPath, dstPath, params):
+    """파일 하나를 처리함
+    return
+        errorMessage : None이면 성공
+    """
+    srcImg = cv2.imread(srcPath, cv2.IMREAD_COLOR)
+    if srcImg is None:
+        return "can not read image"
+    dstImg = preImgProc.maintainRateResize(srcImg, tuple(params["wantSize"]), isRgb=False)
+    if params["rotatedAngle"] is not None:
+        dstImg = preImgProc.noCropRotateImg(dstImg, params["rotatedAngle"])
+    os.makedirs(os.path.dirname(dstPath), exist_ok=True)
+    if not cv2.imwrite(dstPath, dstImg):
+        return "can not write image"
+    return None
+
+def _processChunk(args):
+    """process pool의 worker에서 실행되는 함수, 파일 묶음 하나를 처리함
+    return
+        list of (relPath, errorMessage)
+    """
+    srcDir, dstDir, relPathList, params = args
+    resultList = []
+    for itRelPath in relPathList:
+        try:
+            errorMessage = _processImageFile(os.path.join(srcDir, itRelPath), os.path.join(dstDir, itRelPath), params)
+        except Exception as ex:
+            errorMessage = "{} : {}".format(type(ex).__name__, ex)
+        resultList.append((itRelPath, errorMessage))
+    return resultList
+
+def _loadManifest(manifestPath):
+    if not os.path.isfile(manifestPath):
+        return {}
+    with open(manifestPath, encoding="utf-8") as manifestFile:
+        return json.load(manifestFile)
+
+def _saveManifest(manifestPath, manifestData):
+    tmpPath = manifestPath + ".tmp"
+    with open(tmpPath, "w", encoding="utf-8") as manifestFile:
+        json.dump(manifestData, manifestFile)
+    os.replace(tmpPath, manifestPath)
+
+def runPreprocPipeline(srcDir, dstDir, wantSize = (300, 300), rotatedAngle = None, workers = 4, chunkSize = 32,
+                       manifestPath = None, isForce = False):
+    """srcDir의 이미지를 전처리해서 같은 상대 경로로 dstDir에 저장함
+    manifest와 (크기, 수정시간, 설정)이 같고 결과 파일이 있는 파일은 건너뜀
+    args
+        srcDir, dstDir : str
+        wantSize : tuple(width, height), maintainRateResize와 같음
+        rotatedAngle : None이면 회전하지 않음
+        workers : process 개수, 1이면 현재 process에서 처리함
+        chunkSize : 한 작업에 들어가는 파일 수
+        manifestPath : None이면 dstDir/preprocManifest.json
+        isForce : True이면 manifest를 무시하고 모두 처리함
+    return
+        dict : {"processed": 처리한 수, "skipped": 건너뛴 수, "failed": {relPath: errorMessage}}
+    """
+    assert workers > 0 and chunkSize > 0
+    # 같은 설정이 (300, 300) / [300.0, 300], 90 / 90.0 처럼 다르게 들어와도 hash가 같도록 정규화함
+    params = {"wantSize": [int(itSize) for itSize in wantSize],
+              "rotatedAngle": None if rotatedAngle is None else float(rotatedAngle)}
+    paramsHash = getParamsHash(params)
+    manifestPath = os.path.join(dstDir, MANIFEST_FILE_NAME) if manifestPath is None else manifestPath
+    os.makedirs(dstDir, exist_ok=True)
+    manifestData = {} if isForce else _loadManifest(manifestPath)
+    relPathList = listImageFiles(srcDir)
+    stampDict = {itRelPath: _getFileStamp(os.path.join(srcDir, itRelPath)) for itRelPath in relPathList}
+    # 사라진 원본은 manifest에서 뺌
+    manifestData = {itRelPath: itEntry for itRelPath, itEntry in manifestData.items() if itRelPath in stampDict}
+    todoPathList = []
+    for itRelPath in relPathList:
+        entry = manifestData.get(itRelPath)
+        if (entry is None or entry["stamp"] != stampDict[itRelPath] or entry["params"] != paramsHash
+                or not os.path.isfile(os.path.join(dstDir, itRelPath))):
+            todoPathList.append(itRelPath)
+    taskList = [(srcDir, dstDir, todoPathList[itStart:itStart + chunkSize], params)
+                for itStart in range(0, len(todoPathList), chunkSize)]
+    failedDict = {}
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        resultIter = map(_processChunk, taskList) if executor is None else executor.map(_processChunk, taskList)
+        for itResultList in resultIter:
+            for itRelPath, itErrorMessage in itResultList:
+                if itErrorMessage is None:
+                    manifestData[itRelPath] = {"stamp": stampDict[itRelPath], "params": paramsHash}
+                else:
+                    manifestData.pop(itRelPath, None)
+                    failedDict[itRelPath] = itErrorMessage
+            # 중간에 멈춰도 끝난 묶음은 다시 처리하지 않도록 묶음마다 저장함
+            _saveManifest(manifestPath, manifestData)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if 0 == len(taskList):
+        _saveManifest(manifestPath, manifestData)
+    return {"processed": len(todoPathList) - len(failedDict), "skipped": len(relPathList) - len(todoPathList), "failed": failedDict}
+
+def main(argv = None):
+    import argparse
+    parser = argparse.ArgumentParser(description="폴더의 이미지를 비율 유지 resize (와 회전) 해서 저장함")
+    parser.add_argument("srcDir")
+    parser.add_argument("dstDir")
+    parser.add_argument("--size", type=int, nargs=2, default=[300, 300], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--angle", type=float, default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=32)
+    parser.add_argument("--manifest", default=None)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args(argv)
+    result = runPreprocPipeline(args.srcDir, args.dstDir, tuple(args.size), args.angle, args.workers, args.chunk_size,
+                                args.manifest, args.force)
+    print("processed : {}, skipped : {}, failed : {}".format(result["processed"], result["skipped"], len(result["failed"])))
+    for itRelPath, itErrorMessage in result["failed"].items():
+        print("Error : {} : {}".format(itRelPath, itErrorMessage))
+    return 0 if 0 == len(result["failed"]) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
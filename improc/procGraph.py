@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import hashlib
+import collections
+import cv2
+import numpy as np
+sys.path.append(os.path.dirname(__file__))
+import preImgProc
+
+__version__ = 0.1
+
+# 전처리 단계를 node로 연결한 DAG
+# node의 결과는 필요할 때만 계산하고 fingerprint별로 저장해 둠
+#   source node의 fingerprint : 이미지 데이터의 hash
+#   연산 node의 fingerprint : (연산 이름, 설정, 입력 node들의 fingerprint)의 hash
+# 설정을 바꾸면 그 node와 그 아래 node의 fingerprint만 바뀌므로 그 부분만 다시 계산함
+
+def _toGray(img, isRgb):
+    if 2 == img.ndim:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_RGB2GRAY if isRgb else cv2.COLOR_BGR2GRAY)
+
+def _resizeOp(img, wantSize = (300, 300), isRgb = True):
+    return preImgProc.maintainRateResize(img, tuple(wantSize), isRgb)
+
+def _rotateOp(img, rotatedAngle = 0):
+    return preImgProc.noCropRotateImg(img, rotatedAngle)
+
+def _thresholdOp(img, thresh = 127, maxValue = 255, isOtsu = False, isRgb = True):
+    flags = cv2.THRESH_BINARY | (cv2.THRESH_OTSU if isOtsu else 0)
+    _, dstImg = cv2.threshold(_toGray(img, isRgb), thresh, maxValue, flags)
+    return dstImg
+
+def _cannyOp(img, threshold1 = 100, threshold2 = 200, apertureSize = 3, isRgb = True):
+    return cv2.Canny(_toGray(img, isRgb), threshold1, threshold2, apertureSize=apertureSize)
+
+def _histogramOp(img):
+    """채널별 256 bin histogram, (channels, 256) int64
+    """
+    channelImgs = [img] if 2 == img.ndim else cv2.split(img)
+    return np.stack([np.bincount(itImg.ravel(), minlength=256) for itImg in channelImgs])
+
+OP_DICT = {
+    "resize": _resizeOp,
+    "rotate": _rotateOp,
+    "threshold": _thresholdOp,
+    "canny": _cannyOp,
+    "histogram": _histogramOp,
+}
+
+def registerOp(opName, opFunc):
+    """연산을 추가함, opFunc(*inputImgs, **params) => np.ndarray
+    """
+    OP_DICT[opName] = opFunc
+
+def getDataFingerprint(img):
+    """이미지 데이터의 hash
+    """
+    img = np.ascontiguousarray(img)
+    dataHash = hashlib.sha1(json.dumps([img.shape, img.dtype.str]).encode("utf-8"))
+    dataHash.update(memoryview(img).cast("B"))
+    return dataHash.hexdigest()
+
+class ProcNode:
+    """graph의 node 하나
+        opName : None이면 source node
+        inputNames : 입력 node 이름 목록
+        params : 연산 설정 dict (json으로 바꿀 수 있어야 함)
+    """
+    def __init__(self, name, opName = None, inputNames = (), params = None):
+        self.name = name
+        self.opName = opName
+        self.inputNames = list(inputNames)
+        self.params = {} if params is None else dict(params)
+        self.dataFingerprint = None
+
+class ProcGraph:
+    """lazy하게 계산하고 결과를 fingerprint별로 저장하는 전처리 graph
+    ex)
+        graph = ProcGraph()
+        graph.addSource("src", srcImg)
+        graph.addNode("resize", "resize", ["src"], wantSize=(300, 300))
+        graph.addNode("edge", "canny", ["resize"], threshold1=50, threshold2=150)
+        edgeImg = graph.evaluate("edge")
+        graph.setParams("edge", threshold1=80)    # resize는 다시 계산하지 않음
+    """
+    def __init__(self, maxCacheItems = 64):
+        """
+        args
+            maxCacheItems : 저장하는 결과 개수, 넘으면 오래 쓰지 않은 것부터 버림
+        """
+        self.nodeDict = collections.OrderedDict()
+        self.maxCacheItems = maxCacheItems
+        self._cache = collections.OrderedDict()
+        self._sourceDict = {}
+        self.computeCount = 0
+
+    def addSource(self, name, img):
+        self.nodeDict[name] = ProcNode(name)
+        self.setSource(name, img)
+        return self
+
+    def setSource(self, name, img):
+        """source 이미지를 바꿈, 데이터가 같으면 아래 node는 다시 계산하지 않음
+        """
+        node = self.nodeDict[name]
+        assert node.opName is None
+        node.dataFingerprint = getDataFingerprint(img)
+        self._sourceDict[name] = img
+        return self
+
+    def addNode(self, name, opName, inputNames, **params):
+        assert opName in OP_DICT, opName
+        for itInputName in inputNames:
+            assert itInputName in self.nodeDict, itInputName
+        self.nodeDict[name] = ProcNode(name, opName, inputNames, params)
+        return self
+
+    def setParams(self, name, **params):
+        """node 설정 일부를 바꿈
+        """
+        node = self.nodeDict[name]
+        assert node.opName is not None
+        node.params.update(params)
+        return self
+
+    def getFingerprint(self, name):
+        """node 결과의 fingerprint, 계산하지 않고 입력 fingerprint만으로 구함
+        """
+        node = self.nodeDict[name]
+        if node.opName is None:
+            return node.dataFingerprint
+        nodeKey = json.dumps([node.opName, node.params, [self.getFingerprint(it) for it in node.inputNames]],
+                             sort_keys=True, default=lambda value: value.tolist() if isinstance(value, np.ndarray) else str(value))
+        return hashlib.sha1(nodeKey.encode("utf-8")).hexdigest()
+
+    def evaluate(self, name):
+        """node 결과, 저장된 결과가 없는 node만 계산함
+        결과는 여러 곳에서 공유하므로 쓰기 금지 배열로 반환함
+        """
+        node = self.nodeDict[name]
+        if node.opName is None:
+            return self._sourceDict[name]
+        fingerprint = self.getFingerprint(name)
+        if fingerprint in self._cache:
+            self._cache.move_to_end(fingerprint)
+            return self._cache[fingerprint]
+        inputImgs = [self.evaluate(it) for it in node.inputNames]
+        result = OP_DICT[node.opName](*inputImgs, **node.params)
+        self.computeCount += 1
+        if isinstance(result, np.ndarray):
+            result.flags.writeable = False
+        self._cache[fingerprint] = result
+        while len(self._cache) > self.maxCacheItems:
+            self._cache.popitem(last=False)
+        return result
+
+    def getStepResults(self, name):
+        """name까지의 단계별 (node 이름, 결과) 목록, 입력 순서로 정렬됨
+        """
+        stepList = []
+        def visit(itName):
+            if itName in [it for it, _ in stepList]:
+                return
+            for itInputName in self.nodeDict[itName].inputNames:
+                visit(itInputName)
+            stepList.append((itName, self.evaluate(itName)))
+        visit(name)
+        return stepList
+
+    def clearCache(self):
+        self._cache.clear()
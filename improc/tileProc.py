@@ -0,0 +1,263 @@
+import os
+import sys
+import tempfile
+import fractions
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(__file__))
+import preImgProc
+
+__version__ = 0.1
+
+# 아주 큰 이미지(수만 pixel)를 tile 단위로 나누어 처리하는 도구
+# 원본은 np.load(mmap_mode="r") 등으로 연 memmap이어도 되고 tile 영역만 읽음
+# 결과는 out 배열이나 outPath의 .npy memmap에 tile 단위로 바로 씀
+# 최대 메모리는 (tile + 여유 영역) 크기 * thread 수 정도로 제한되고 결과는 한번에 처리한 것과 같음
+# (affine 변환만 warpAffine 대신 전체 좌표 map의 remap과 같음)
+
+def _getTileRanges(length, tileSize, align = 1):
+    """[0, length)를 tileSize 이하(align의 배수)로 나눈 (start, stop) 목록
+    """
+    tileSize = max(align, tileSize // align * align)
+    return [(itStart, min(itStart + tileSize, length)) for itStart in range(0, length, tileSize)]
+
+def _getTileList(height, width, tileSize, alignY = 1, alignX = 1):
+    """(top, bottom, left, right) 목록
+    """
+    return [(itTop, itBottom, itLeft, itRight)
+            for itTop, itBottom in _getTileRanges(height, tileSize, alignY)
+            for itLeft, itRight in _getTileRanges(width, tileSize, alignX)]
+
+def _getOutput(shape, dtype, out = None, outPath = None):
+    """결과 배열, out이 없고 outPath가 있으면 .npy memmap을 만듬
+    """
+    if out is None:
+        if outPath is None:
+            out = np.empty(shape, dtype)
+        else:
+            out = np.lib.format.open_memmap(outPath, mode="w+", dtype=dtype, shape=tuple(shape))
+    assert out.shape == tuple(shape) and out.dtype == np.dtype(dtype)
+    return out
+
+def _runTiles(tileFunc, tileList, workers):
+    if 1 == workers:
+        for itTile in tileList:
+            tileFunc(itTile)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(tileFunc, tileList))
+
+def tiledFilter(srcImg, filterFunc, halo, tileSize = 1024, outDtype = None, out = None, outPath = None, workers = 4):
+    """크기가 바뀌지 않는 국소 filter를 tile마다 halo만큼 넓혀서 적용함
+    filter가 참조하는 범위가 halo 이하이면 한번에 적용한 것과 같음 (이미지 끝의 border 처리도 같음)
+    args
+        srcImg : np.ndarray (rows, cols) or (rows, cols, channels), memmap 가능
+        filterFunc : filterFunc(tileImg) => 같은 (rows, cols)의 np.ndarray
+        halo : filter가 참조하는 주변 pixel 수
+        tileSize : tile 한 변의 길이
+        outDtype : None이면 filterFunc 결과의 dtype (ex : uint8 이미지에 CV_32F Sobel => float32)
+        out, outPath : 결과를 쓸 배열 혹은 .npy 경로
+        workers : thread 개수
+    return
+        out : np.ndarray
+    """
+    srcHeight, srcWidth = srcImg.shape[:2]
+    tileList = _getTileList(srcHeight, srcWidth, tileSize)
+    outList = [out]
+
+    def filterTile(tile):
+        top, bottom, left, right = tile
+        haloTop, haloLeft = max(0, top - halo), max(0, left - halo)
+        tileImg = np.ascontiguousarray(srcImg[haloTop:min(srcHeight, bottom + halo), haloLeft:min(srcWidth, right + halo)])
+        dstImg = filterFunc(tileImg)
+        return dstImg[top - haloTop:bottom - haloTop, left - haloLeft:right - haloLeft]
+
+    # 첫 tile로 결과 채널 수를 정함
+    firstImg = filterTile(tileList[0])
+    outList[0] = _getOutput((srcHeight, srcWidth) + firstImg.shape[2:], firstImg.dtype if outDtype is None else outDtype, out, outPath)
+    outList[0][:firstImg.shape[0], :firstImg.shape[1]] = firstImg
+
+    def writeTile(tile):
+        top, bottom, left, right = tile
+        outList[0][top:bottom, left:right] = filterTile(tile)
+
+    _runTiles(writeTile, tileList[1:], workers)
+    return outList[0]
+
+def _hysteresisPass(weakMask, edgeMask, tileList, workers):
+    """tile마다 weak 연결 요소 중 edge를 포함하는 것을 edge로 만듬, 바뀐 tile이 있으면 True
+    """
+    srcHeight, srcWidth = weakMask.shape
+    changedList = []
+
+    def growTile(tile):
+        top, bottom, left, right = tile
+        haloTop, haloLeft = max(0, top - 1), max(0, left - 1)
+        haloBottom, haloRight = min(srcHeight, bottom + 1), min(srcWidth, right + 1)
+        weakImg = np.ascontiguousarray(weakMask[haloTop:haloBottom, haloLeft:haloRight])
+        edgeImg = edgeMask[haloTop:haloBottom, haloLeft:haloRight]
+        _, labels = cv2.connectedComponents(weakImg, connectivity=8)
+        seedLabels = np.unique(labels[(0 != edgeImg) & (0 != weakImg)])
+        seedLabels = seedLabels[0 != seedLabels]
+        grownImg = np.where(np.isin(labels, seedLabels), np.uint8(255), np.uint8(0))
+        centerSlice = (slice(top - haloTop, bottom - haloTop), slice(left - haloLeft, right - haloLeft))
+        if np.count_nonzero(grownImg[centerSlice]) != np.count_nonzero(edgeMask[top:bottom, left:right]):
+            edgeMask[top:bottom, left:right] = grownImg[centerSlice]
+            changedList.append(tile)
+
+    _runTiles(growTile, tileList, workers)
+    return 0 < len(changedList)
+
+def tiledCanny(srcImg, threshold1, threshold2, apertureSize = 3, L2gradient = False, tileSize = 1024, out = None, outPath = None, workers = 4):
+    """cv2.Canny와 같은 결과를 tile 단위로 구함
+    gradient와 non-maximum suppression은 국소 연산이므로 halo로 처리하고
+    전체에 걸친 hysteresis는 tile 단위 연결 요소 확장을 바뀌지 않을 때까지 반복함
+        weak : cv2.Canny(low, low) (low 이상인 국소 최대)
+        strong : cv2.Canny(high, high)
+        결과 : strong을 포함하는 weak의 8-연결 요소
+    args
+        srcImg : np.ndarray uint8 (rows, cols) or (rows, cols, channels)
+        threshold1, threshold2, apertureSize, L2gradient : cv2.Canny와 같음
+        tileSize, out, outPath, workers : tiledFilter와 같음
+    return
+        out : np.ndarray uint8 (rows, cols)
+    """
+    lowThresh, highThresh = min(threshold1, threshold2), max(threshold1, threshold2)
+    halo = apertureSize // 2 + 2
+    edgeMask = tiledFilter(srcImg, lambda tileImg: cv2.Canny(tileImg, highThresh, highThresh, apertureSize=apertureSize, L2gradient=L2gradient),
+                           halo, tileSize, np.uint8, out, outPath, workers)
+    # weak는 결과와 같은 크기이므로 결과가 파일이면 weak도 임시 파일에 둠
+    with tempfile.TemporaryDirectory() as tmpDir:
+        weakPath = None if outPath is None and not isinstance(edgeMask, np.memmap) else os.path.join(tmpDir, "weak.npy")
+        weakMask = tiledFilter(srcImg, lambda tileImg: cv2.Canny(tileImg, lowThresh, lowThresh, apertureSize=apertureSize, L2gradient=L2gradient),
+                               halo, tileSize, np.uint8, None, weakPath, workers)
+        tileList = _getTileList(srcImg.shape[0], srcImg.shape[1], tileSize)
+        while _hysteresisPass(weakMask, edgeMask, tileList, workers):
+            pass
+        del weakMask
+    return edgeMask
+
+def _getInverseAffine(affineMatrix):
+    """cv2.warpAffine 내부와 같은 순서로 계산한 역행렬 (6,)
+    """
+    invMatrix = np.asarray(affineMatrix, np.float64).reshape(-1).copy()
+    det = invMatrix[0] * invMatrix[4] - invMatrix[1] * invMatrix[3]
+    det = 1. / det if 0 != det else 0.
+    a11, a22 = invMatrix[4] * det, invMatrix[0] * det
+    invMatrix[0], invMatrix[4] = a11, a22
+    invMatrix[1] *= -det
+    invMatrix[3] *= -det
+    b1 = -invMatrix[0] * invMatrix[2] - invMatrix[1] * invMatrix[5]
+    b2 = -invMatrix[3] * invMatrix[2] - invMatrix[4] * invMatrix[5]
+    invMatrix[2], invMatrix[5] = b1, b2
+    return invMatrix
+
+def _getSourceRange(coords, length, margin):
+    """좌표들이 참조하는 원본 범위 [start, stop), 비어 있지 않도록 원본 안으로 자름
+    """
+    start = int(np.clip(np.floor(coords.min()) - margin, 0, length - 1))
+    stop = int(np.clip(np.ceil(coords.max()) + margin + 1, start + 1, length))
+    return start, stop
+
+def tiledWarpAffine(srcImg, affineMatrix, dsize, flags = cv2.INTER_LINEAR, borderMode = cv2.BORDER_REPLICATE, borderValue = 0,
+                    tileSize = 1024, out = None, outPath = None, workers = 4):
+    """결과 tile마다 참조하는 원본 영역만 잘라서 affine 변환함
+    좌표 map은 전체 좌표계에서 float32로 만든 뒤 잘린 위치(정수)를 빼므로 (float32에서 정확함)
+    tile 나누기와 상관없이 전체 좌표 map으로 cv2.remap 한 것과 같음
+    cv2.warpAffine과는 OpenCV 버전별 내부 좌표 반올림 차이만 있음 (보간 결과 linear 1, lanczos 2 이하)
+    args
+        srcImg : np.ndarray, memmap 가능
+        affineMatrix : 2x3 원본 => 결과
+        dsize : tuple(width, height)
+        flags : 보간 방법 (WARP_INVERSE_MAP 제외)
+        borderMode : BORDER_CONSTANT or BORDER_REPLICATE (잘린 영역 안에서 처리되는 border만 가능)
+        borderValue : BORDER_CONSTANT의 값
+        tileSize, out, outPath, workers : tiledFilter와 같음
+    return
+        out : np.ndarray
+    """
+    assert 0 == flags & cv2.WARP_INVERSE_MAP
+    assert borderMode in (cv2.BORDER_CONSTANT, cv2.BORDER_REPLICATE)
+    srcHeight, srcWidth = srcImg.shape[:2]
+    dstWidth, dstHeight = dsize
+    invMatrix = _getInverseAffine(affineMatrix)
+    out = _getOutput((dstHeight, dstWidth) + srcImg.shape[2:], srcImg.dtype, out, outPath)
+    # 보간이 참조하는 주변 pixel 수 (lanczos4가 가장 넓음)
+    margin = 4
+
+    def warpTile(tile):
+        top, bottom, left, right = tile
+        dstX, dstY = np.meshgrid(np.arange(left, right, dtype=np.float64), np.arange(top, bottom, dtype=np.float64))
+        mapX = (invMatrix[0] * dstX + invMatrix[1] * dstY + invMatrix[2]).astype(np.float32)
+        mapY = (invMatrix[3] * dstX + invMatrix[4] * dstY + invMatrix[5]).astype(np.float32)
+        srcLeft, srcRight = _getSourceRange(mapX, srcWidth, margin)
+        srcTop, srcBottom = _getSourceRange(mapY, srcHeight, margin)
+        mapX -= np.float32(srcLeft)
+        mapY -= np.float32(srcTop)
+        tileImg = np.ascontiguousarray(srcImg[srcTop:srcBottom, srcLeft:srcRight])
+        dstImg = cv2.remap(tileImg, mapX, mapY, flags, borderMode=borderMode, borderValue=borderValue)
+        out[top:bottom, left:right] = dstImg.reshape(out[top:bottom, left:right].shape)
+
+    _runTiles(warpTile, _getTileList(dstHeight, dstWidth, tileSize), workers)
+    return out
+
+def tiledResizeArea(srcImg, dsize, tileSize = 1024, out = None, outPath = None, workers = 4):
+    """INTER_AREA 축소를 tile 단위로 함
+    축소 비율 p/q (결과 p pixel = 원본 q pixel)의 배수로 tile을 나누면 tile 안의 area 가중치가
+    전체를 한번에 처리할 때와 같으므로 결과가 같음
+    args
+        srcImg : np.ndarray, memmap 가능
+        dsize : tuple(width, height), 원본보다 작거나 같아야 함
+        tileSize, out, outPath, workers : tiledFilter와 같음
+    return
+        out : np.ndarray
+    """
+    srcHeight, srcWidth = srcImg.shape[:2]
+    dstWidth, dstHeight = dsize
+    assert 0 < dstWidth <= srcWidth and 0 < dstHeight <= srcHeight
+    rateX = fractions.Fraction(dstWidth, srcWidth)
+    rateY = fractions.Fraction(dstHeight, srcHeight)
+    out = _getOutput((dstHeight, dstWidth) + srcImg.shape[2:], srcImg.dtype, out, outPath)
+    # 결과 tile 크기 (원본 tile은 여기에 q/p를 곱한 정수)
+    dstTileSize = max(1, int(tileSize * min(rateX, rateY)))
+    tileList = _getTileList(dstHeight, dstWidth, dstTileSize, rateY.numerator, rateX.numerator)
+
+    def resizeTile(tile):
+        top, bottom, left, right = tile
+        srcTop, srcBottom = int(top / rateY), int(bottom / rateY)
+        srcLeft, srcRight = int(left / rateX), int(right / rateX)
+        tileImg = np.ascontiguousarray(srcImg[srcTop:srcBottom, srcLeft:srcRight])
+        roiImg = out[top:bottom, left:right]
+        dstImg = cv2.resize(tileImg, (right - left, bottom - top), interpolation=cv2.INTER_AREA)
+        roiImg[...] = dstImg.reshape(roiImg.shape)
+
+    _runTiles(resizeTile, tileList, workers)
+    return out
+
+def tiledMaintainRateResize(srcImg, wantSize = (300, 300), tileSize = 1024, workers = 4):
+    """preImgProc.maintainRateResize와 같은 결과를 원본 전체를 복사하지 않고 만듬
+    축소(INTER_AREA)일 때 tiledResizeArea를 사용함, 결과는 작으므로 메모리에 만듬
+    args
+        srcImg : np.ndarray (rows, cols, channels), memmap 가능
+        wantSize : tuple(width, height) 둘 다 0보다 커야 함
+    return
+        dstImg : np.ndarray
+    """
+    srcHeight, srcWidth, channels = srcImg.shape
+    wantWidth, wantHeight = wantSize
+    plan = preImgProc._getResizePlan(srcHeight, srcWidth, wantWidth, wantHeight)
+    if plan.interpolation != cv2.INTER_AREA or plan.dstWidth > srcWidth or plan.dstHeight > srcHeight:
+        return preImgProc.maintainRateResize(np.asarray(srcImg), tuple(wantSize))
+    dstImg = np.empty((wantHeight, wantWidth, channels), srcImg.dtype)
+    tiledResizeArea(srcImg, (plan.dstWidth, plan.dstHeight), tileSize,
+                    out=dstImg[plan.top:plan.top + plan.dstHeight, plan.left:plan.left + plan.dstWidth], workers=workers)
+    return preImgProc._fillLetterboxPadding(plan, dstImg)
+
+def tiledNoCropRotateImg(srcImg, rotatedAngle, tileSize = 1024, out = None, outPath = None, workers = 4):
+    """preImgProc.noCropRotateImg와 같은 결과를 tile 단위로 만듬
+    """
+    srcHeight, srcWidth = srcImg.shape[:2]
+    rotMatrix = preImgProc._getNoCropRotateMatrix(srcHeight, srcWidth, rotatedAngle)
+    return tiledWarpAffine(srcImg, rotMatrix, (srcWidth, srcHeight), cv2.INTER_LINEAR, cv2.BORDER_REPLICATE,
+                           tileSize=tileSize, out=out, outPath=outPath, workers=workers)